@@ -0,0 +1,139 @@
+"""Throughput and tail latency of the read endpoints under slow clients,
+served by gunicorn (igin.wsgi, sync workers) and by uvicorn (igin.asgi).
+
+Every client trickles its request bytes over ``--trickle`` seconds before
+reading the response, like a mobile client on a poor link. A sync worker
+is held for the whole upload, the event loop is not.
+
+    python benchmarks/asgi_vs_wsgi.py --clients 64 --requests 8 --workers 2
+
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'igin.settings')
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from needs import seeds  # noqa: E402
+
+PATHS = ['/need/', '/goal/', '/iteration/active/', '/delivery/', '/bootstrap/']
+
+
+def seed():
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user('bench-%d' % time.time_ns(), password='x')
+    seeds.apply(user, seeds.WIZARD, seeds.TUTORIAL)
+    return Token.objects.create(user=user).key
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start(command, port):
+    # outside ROOT, so gunicorn does not pick up gunicorn.conf.py and its
+    # worker class; the command line is all the server is configured with
+    server = subprocess.Popen(command, cwd=tempfile.gettempdir(),
+                              env=dict(os.environ, PYTHONPATH=ROOT),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit('%s did not start' % command[0])
+
+
+async def fetch(port, path, token, trickle):
+    request = ('GET %s HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Token %s\r\n'
+               'Connection: close\r\n\r\n' % (path, token)).encode()
+    started = time.monotonic()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    pieces = 8
+    size = -(-len(request) // pieces)
+    for start in range(0, len(request), size):
+        writer.write(request[start:start + size])
+        await writer.drain()
+        await asyncio.sleep(trickle / pieces)
+    response = await reader.read()
+    writer.close()
+    if not response.startswith(b'HTTP/1.1 200'):
+        raise RuntimeError(response.split(b'\r\n', 1)[0].decode())
+    return time.monotonic() - started
+
+
+async def client(port, token, requests, trickle, latencies):
+    for i in range(requests):
+        latencies.append(await fetch(port, PATHS[i % len(PATHS)], token, trickle))
+
+
+async def load(port, token, clients, requests, trickle):
+    latencies = []
+    started = time.monotonic()
+    await asyncio.gather(*[client(port, token, requests, trickle, latencies)
+                           for _ in range(clients)])
+    return time.monotonic() - started, sorted(latencies)
+
+
+def report(name, elapsed, latencies):
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print('%-8s %6d requests  %8.1f req/s  p50 %7.1f ms  p99 %7.1f ms' % (
+        name, len(latencies), len(latencies) / elapsed,
+        latencies[len(latencies) // 2] * 1000, p99 * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=8, help='Requests per client.')
+    parser.add_argument('--trickle', type=float, default=0.5,
+                        help='Seconds each client takes to send its request.')
+    parser.add_argument('--workers', type=int, default=2, help='Server processes.')
+    args = parser.parse_args()
+
+    token = seed()
+    servers = {
+        'wsgi': lambda port: [sys.executable, '-m', 'gunicorn', 'igin.wsgi',
+                              '--bind', '127.0.0.1:%d' % port, '--workers', str(args.workers),
+                              '--worker-class', 'sync'],
+        'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'igin.asgi:application',
+                              '--port', str(port), '--workers', str(args.workers),
+                              '--log-level', 'warning'],
+    }
+    for name, command in servers.items():
+        port = free_port()
+        server = start(command(port), port)
+        try:
+            elapsed, latencies = asyncio.run(
+                load(port, token, args.clients, args.requests, args.trickle))
+        finally:
+            server.terminate()
+            server.wait()
+        report(name, elapsed, latencies)
+
+
+if __name__ == '__main__':
+    main()
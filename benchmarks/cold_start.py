@@ -0,0 +1,102 @@
+"""Cold start and steady state of gunicorn with and without gunicorn.conf.py.
+
+The baseline is what the Procfile used to run: ``gunicorn igin.wsgi`` with
+sync workers, no preload and no warm-up. Both are started with the same
+number of workers; for each the script reports the time from spawning
+the server to its first response, the latency of a first wave of
+concurrent requests (one per worker thread, each paying for whatever was
+not warmed) and the steady-state throughput and tail latency.
+
+    python benchmarks/cold_start.py --workers 2 --requests 400
+
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# seeding and the HTTP client are shared with the ASGI benchmark
+from asgi_vs_wsgi import PATHS, ROOT, fetch, free_port, seed
+
+
+def spawn(command, port, env, token):
+    """Start a server, returns it and the seconds until its first response."""
+    started = time.monotonic()
+    # outside the repo root, so only the configured run reads gunicorn.conf.py
+    server = subprocess.Popen(command, cwd=tempfile.gettempdir(), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = started + 60
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(fetch(port, PATHS[0], token, 0))
+            return server, time.monotonic() - started
+        except (OSError, RuntimeError):
+            time.sleep(0.05)
+    server.kill()
+    raise SystemExit('%s did not start' % ' '.join(command))
+
+
+async def wave(port, token, count):
+    return sorted(await asyncio.gather(*[fetch(port, PATHS[i % len(PATHS)], token, 0)
+                                         for i in range(count)]))
+
+
+async def steady(port, token, requests, concurrency):
+    latencies = []
+    paths = [PATHS[i % len(PATHS)] for i in range(requests)]
+
+    async def client():
+        while paths:
+            latencies.append(await fetch(port, paths.pop(), token, 0))
+
+    started = time.monotonic()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return time.monotonic() - started, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Threads per gthread worker of the configured run.')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    token = seed()
+    env = dict(os.environ, PYTHONPATH=ROOT, WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads))
+    config = ['-c', os.path.join(ROOT, 'gunicorn.conf.py')]
+    # name -> gunicorn arguments, GUNICORN_WORKER_CLASS, threads per worker
+    runs = {
+        'baseline': (['igin.wsgi', '--workers', str(args.workers)], 'sync', 1),
+        'sync': (config, 'sync', 1),
+        'gthread': (config, 'gthread', args.threads),
+    }
+    print('%-9s %10s %14s %14s %10s %9s %9s' % (
+        'run', 'first (s)', 'wave p50 (ms)', 'wave max (ms)', 'req/s', 'p50 (ms)', 'p99 (ms)'))
+    for name, (arguments, worker_class, threads) in runs.items():
+        port = free_port()
+        command = [sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:%d' % port,
+                   *arguments]
+        server, first = spawn(command, port, dict(env, GUNICORN_WORKER_CLASS=worker_class),
+                              token)
+        try:
+            first_wave = asyncio.run(wave(port, token, args.workers * threads))
+            elapsed, latencies = asyncio.run(
+                steady(port, token, args.requests, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        print('%-9s %10.2f %14.1f %14.1f %10.1f %9.1f %9.1f' % (
+            name, first, first_wave[len(first_wave) // 2] * 1000, first_wave[-1] * 1000,
+            len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000,
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000))
+
+
+if __name__ == '__main__':
+    main()
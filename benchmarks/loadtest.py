@@ -0,0 +1,305 @@
+"""Load test of every route in needs/urls.py with concurrent authenticated clients.
+
+Each client logs in as one of the users made by ``manage.py
+generate_dataset`` and runs a scenario touching every route: it creates a
+need, a goal, a step and a delivery, reads and updates them through the
+list, detail and nested routes, plans the delivery into the active
+iteration and deletes what it created. It opens the events/ stream until
+its first frame, and staff users read cache/stats/. Each pass ends by
+rolling the active iteration over, so every pass adds one iteration per
+user; everything else is left as it was and runs can be repeated on the
+same dataset. Per route it reports throughput, p50/p95/p99 latency and,
+when the server runs with QUERY_COUNT_HEADER=1, queries per request.
+
+    DATABASE_URL=... python manage.py generate_dataset --users 1000 --staff 10
+    DATABASE_URL=... QUERY_COUNT_HEADER=1 gunicorn &
+    DATABASE_URL=... python benchmarks/loadtest.py --url http://127.0.0.1:8000 \\
+        --clients 32 --duration 60 --output results.json
+
+The driver reads tokens and ids from DATABASE_URL, the server's database.
+Use PostgreSQL for numbers worth comparing, SQLite fails concurrent writes
+with "database is locked" (counted as errors).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'igin.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from needs import urls  # noqa: E402
+from needs.models import Delivery, Goal, Iteration, Need, Step, UserState  # noqa: E402
+from needs.tokens import issue_tokens  # noqa: E402
+
+# routes the scenario leaves out, and why
+SKIPPED = {
+    'wizard': 'seeds new accounts once',
+    'tutorial_setup': 'seeds new accounts once',
+    'onboarding': 'seeds new accounts once',
+}
+
+
+class Client:
+
+    def __init__(self, host, port, token, stats):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.stats = stats
+
+    async def send(self, method, path, body, auth, extra=()):
+        payload = b'' if body is None else json.dumps(body).encode()
+        head = ['%s %s HTTP/1.1' % (method, path), 'Host: %s' % self.host,
+                'Connection: close', 'Content-Length: %d' % len(payload)]
+        head.extend(extra)
+        if body is not None:
+            head.append('Content-Type: application/json')
+        if auth:
+            head.append('Authorization: Token %s' % self.token)
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + payload)
+        await writer.drain()
+        return reader, writer
+
+    def record(self, name, method, started, response):
+        header, _, content = response.partition(b'\r\n\r\n')
+        lines = header.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+        queries = {key.lower(): value for key, value in headers.items()}.get('x-query-count')
+        self.stats['%s %s' % (method, name)].append(
+            (time.monotonic() - started, status, int(queries) if queries is not None else None))
+        return status, content
+
+    async def request(self, name, method, path, body=None, auth=True):
+        started = time.monotonic()
+        reader, writer = await self.send(method, path, body, auth)
+        response = await reader.read()
+        writer.close()
+        status, content = self.record(name, method, started, response)
+        if status >= 400:
+            return None
+        return json.loads(content) if content.strip() else {}
+
+    async def stream(self, name, path):
+        """Opens an event stream and hangs up after its first frame."""
+        started = time.monotonic()
+        reader, writer = await self.send('GET', path, None, True,
+                                         ['Accept: text/event-stream'])
+        response = b''
+        while b'\n\n' not in response.partition(b'\r\n\r\n')[2]:
+            chunk = await reader.read(4096)
+            if not chunk:
+                break
+            response += chunk
+        writer.close()
+        self.record(name, 'GET', started, response)
+
+
+async def scenario(client, user):
+    """One pass over the routes as ``user``, adding only the rolled over iteration."""
+    need_id, refresh = user['need'], user['refresh']
+    await client.stream('event_stream', '/events/')
+    if user['staff']:
+        await client.request('cache_stats', 'GET', '/cache/stats/')
+    await client.request('need_list', 'GET', '/need/')
+    need = await client.request('need_list', 'POST', '/need/',
+                                {'name': 'load', 'description': 'load'})
+    await client.request('need_detail', 'GET', '/need/%d/' % need['id'])
+    await client.request('need_detail', 'PUT', '/need/%d/' % need['id'],
+                         {'name': 'load', 'description': 'updated'})
+
+    await client.request('goal_list', 'GET', '/goal/')
+    goal = await client.request('goal_list', 'POST', '/goal/',
+                                {'name': 'load', 'description': 'load', 'need': need['id']})
+    await client.request('goal_list_by_need', 'GET', '/%d/goals/' % need_id)
+    await client.request('goal_detail', 'GET', '/goal/%d/' % goal['id'])
+    await client.request('goal_detail', 'PUT', '/goal/%d/' % goal['id'],
+                         {'name': 'load', 'description': 'updated', 'need': need['id']})
+
+    await client.request('step_list', 'GET', '/step/')
+    step = await client.request('step_list', 'POST', '/step/',
+                                {'name': 'load', 'description': 'load', 'goal': goal['id']})
+    await client.request('step_list_by_goal', 'GET', '/%d/steps/' % user['goal'])
+    await client.request('step_detail', 'GET', '/step/%d/' % step['id'])
+    await client.request('step_detail', 'PUT', '/step/%d/' % step['id'],
+                         {'name': 'load', 'description': 'updated', 'goal': goal['id']})
+
+    await client.request('delivery_list', 'GET', '/delivery/')
+    delivery = await client.request('delivery_list', 'POST', '/delivery/',
+                                    {'name': 'load', 'description': 'load',
+                                     'step': step['id']})
+    await client.request('delivery_list_by_step', 'GET', '/%d/delivery/' % user['step'])
+    await client.request('delivery_list_by_goal', 'GET', '/%d/delivery_by_goal/' % user['goal'])
+    await client.request('delivery_detail', 'GET', '/delivery/%d/' % delivery['id'])
+    await client.request('delivery_detail', 'PUT', '/delivery/%d/' % delivery['id'],
+                         {'name': 'load', 'description': 'updated', 'step': step['id']})
+    await client.request('delivery_bulk_update', 'PATCH', '/delivery/bulk/',
+                         [{'id': delivery['id'], 'completed': True}])
+
+    await client.request('iteration_list', 'GET', '/iteration/')
+    # the last pass, or another client of the user, may have rolled it over
+    active = await client.request('active_iteration', 'GET', '/iteration/active/')
+    iteration_id = active['id'] if active else user['iteration']
+    await client.request('iteration_detail', 'GET', '/iteration/%d/' % iteration_id)
+    await client.request('iteration_plan', 'POST', '/iteration/%d/plan/' % iteration_id,
+                         {'add': [delivery['id']]})
+    await client.request('delivery_list_by_iteration', 'GET',
+                         '/iteration/%d/delivery/' % iteration_id)
+    await client.request('bootstrap', 'GET', '/bootstrap/')
+    tokens = await client.request('token_refresh', 'POST', '/token/refresh/',
+                                  {'refresh': refresh}, auth=False)
+    # refresh tokens work once, the next pass uses the rotated one
+    if tokens:
+        user['refresh'] = tokens['refresh']
+
+    await client.request('delivery_detail', 'DELETE', '/delivery/%d/' % delivery['id'])
+    await client.request('step_detail', 'DELETE', '/step/%d/' % step['id'])
+    await client.request('goal_detail', 'DELETE', '/goal/%d/' % goal['id'])
+    await client.request('need_detail', 'DELETE', '/need/%d/' % need['id'])
+    await client.request('iteration_rollover', 'POST', '/iteration/active/rollover/')
+
+
+def untested_routes(stats):
+    """Routes of needs/urls.py the run neither requested nor skipped."""
+    requested = {key.split(' ', 1)[1] for key in stats}
+    names = {pattern.name for pattern in urls.urlpatterns}
+    return sorted(names - requested - set(SKIPPED))
+
+
+def load_users(prefix, count):
+    users = []
+    for user in User.objects.filter(username__startswith=prefix + '-').order_by('pk')[:count]:
+        token, _ = Token.objects.get_or_create(user=user)
+        step = Step.objects.filter(owner=user).order_by('pk').first()
+        iteration = Iteration.objects.filter(owner=user, completed=False).first()
+        if step is None or iteration is None:
+            continue
+        users.append({
+            'token': token.key,
+            'need': Need.objects.filter(user=user).order_by('pk').first().pk,
+            'goal': step.goal_id,
+            'step': step.pk,
+            'iteration': iteration.pk,
+            'staff': user.is_staff,
+            'user': user,
+        })
+    if not users:
+        raise SystemExit('No generated users found, run manage.py generate_dataset first.')
+    return users
+
+
+async def run(url, users, clients, duration):
+    parts = urlsplit(url)
+    stats = defaultdict(list)
+    deadline = time.monotonic() + duration
+
+    async def worker(user):
+        client = Client(parts.hostname, parts.port or 80, user['token'], stats)
+        while time.monotonic() < deadline:
+            try:
+                await scenario(client, user)
+            except (TypeError, KeyError):
+                # a create failed, its error status is in the stats already
+                pass
+
+    started = time.monotonic()
+    await asyncio.gather(*[worker(users[i % len(users)]) for i in range(clients)])
+    return stats, time.monotonic() - started
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(sample[0] for sample in samples)
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[1] >= 400),
+        'throughput': round(len(samples) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds.')
+    parser.add_argument('--users', type=int, default=100,
+                        help='Generated users the clients log in as.')
+    parser.add_argument('--prefix', default='load', help='See generate_dataset --prefix.')
+    parser.add_argument('--label', default='', help='Stored in the results.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    users = load_users(args.prefix, args.users)
+    # every client its own refresh token, each one can only be used once
+    sessions = []
+    for i in range(args.clients):
+        user = users[i % len(users)]
+        sessions.append(dict(user, refresh=issue_tokens(
+            user['user'], UserState.token_version_of(user['user']))['refresh']))
+    stats, elapsed = asyncio.run(run(args.url, sessions, args.clients, args.duration))
+
+    results = {
+        'label': args.label,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'url': args.url,
+        'clients': args.clients,
+        'users': len(users),
+        'duration': round(elapsed, 2),
+        'dataset': {model.__name__: model.objects.count()
+                    for model in (User, Need, Goal, Step, Iteration, Delivery)},
+        'routes': {key: summarize(samples, elapsed) for key, samples in sorted(stats.items())},
+        'total': summarize([sample for samples in stats.values() for sample in samples],
+                           elapsed),
+        'skipped_routes': SKIPPED,
+        'untested_routes': untested_routes(stats),
+    }
+
+    print('%-36s %8s %6s %8s %8s %8s %8s %8s' % (
+        'route', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+    for key, row in list(results['routes'].items()) + [('total', results['total'])]:
+        print('%-36s %8d %6d %8.1f %8.1f %8.1f %8.1f %8s' % (
+            key, row['requests'], row['errors'], row['throughput'], row['p50_ms'],
+            row['p95_ms'], row['p99_ms'],
+            '-' if row['queries_per_request'] is None else row['queries_per_request']))
+    if results['untested_routes']:
+        print('Not load tested: %s' % ', '.join(results['untested_routes']), file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Query plans of the view access patterns with and without the indexes
+added in needs/migrations/0026_access_pattern_indexes.py.
+
+Seeds synthetic rows, prints EXPLAIN output and the average run time of
+each query, then repeats on a fresh seed with the indexes dropped. Each
+run happens in a transaction that is rolled back, so the database is
+left untouched.
+
+    DATABASE_URL=postgres://... python benchmarks/query_plans.py --users 200
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'igin.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from needs.models import Delivery, Goal, Iteration, Need, Step  # noqa: E402
+
+INDEXES = [
+    'step_goal_completed_idx',
+    'iteration_owner_completed_idx',
+    'iteration_one_active_per_owner',
+    'delivery_step_completed_idx',
+    'delivery_iteration_complet_idx',
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(users, goals, steps, deliveries, iterations):
+    User.objects.bulk_create(
+        [User(username='plan-%d-%d' % (time.time_ns(), i)) for i in range(users)])
+    owners = list(User.objects.order_by('-pk')[:users])
+    needs = [Need(name='need', user=owner) for owner in owners]
+    Need.objects.bulk_create(needs)
+    needs = list(Need.objects.filter(user__in=owners))
+    Goal.objects.bulk_create(
+        [Goal(name='goal', need=need) for need in needs for _ in range(goals)])
+    all_goals = list(Goal.objects.filter(owner__in=owners))
+    Step.objects.bulk_create(
+        [Step(name='step', goal=goal, completed=i % 3 == 0)
+         for goal in all_goals for i in range(steps)])
+    Iteration.objects.bulk_create(
+        [Iteration(number=i, completed=i < iterations - 1, date=date.today(), owner=owner)
+         for owner in owners for i in range(iterations)])
+    active = {iteration.owner_id: iteration for iteration in
+              Iteration.objects.filter(owner__in=owners, completed=False)}
+    for step in Step.objects.filter(owner__in=owners).iterator():
+        Delivery.objects.bulk_create(
+            [Delivery(name='delivery', description='', step=step, owner_id=step.owner_id,
+                      iteration=active[step.owner_id] if i % 2 else None,
+                      completed=i % 4 == 0)
+             for i in range(deliveries)])
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return owners[len(owners) // 2]
+
+
+def patterns(owner):
+    iteration = Iteration.objects.get(owner=owner, completed=False)
+    step = Step.objects.filter(owner=owner).first()
+    goal = step.goal
+    return [
+        ('active iteration (owner, completed)',
+         Iteration.objects.filter(owner=owner, completed=False)),
+        ('open deliveries of a step (step, completed)',
+         Delivery.objects.filter(step=step, completed=False)),
+        ('open deliveries of an iteration (iteration, completed)',
+         Delivery.objects.filter(iteration=iteration, completed=False)),
+        ('open steps of a goal (goal, completed)',
+         Step.objects.filter(goal=goal, completed=False)),
+    ]
+
+
+def report(title, owner, repeat):
+    print('=' * 20, title, '=' * 20)
+    for name, queryset in patterns(owner):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.all())
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        print('-- %s: %.3f ms' % (name, elapsed))
+        print(queryset.explain())
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--goals', type=int, default=5)
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--deliveries', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    for title, drop in (('with indexes', False), ('without indexes', True)):
+        try:
+            with transaction.atomic():
+                owner = seed(args.users, args.goals, args.steps, args.deliveries,
+                             args.iterations)
+                if drop:
+                    with connection.cursor() as cursor:
+                        for name in INDEXES:
+                            cursor.execute('DROP INDEX %s' % connection.ops.quote_name(name))
+                report(title, owner, args.repeat)
+                raise Rollback
+        except Rollback:
+            pass
+        # SQLite caches prepared plans per connection
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
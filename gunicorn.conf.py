@@ -0,0 +1,61 @@
+"""gunicorn settings of the web dyno, read by gunicorn from the working directory.
+
+GUNICORN_WORKER_CLASS picks the worker model:
+
+  - ``gthread`` (default): threaded WSGI workers, a slow client or an
+    events/ stream only holds one thread.
+  - ``sync``: one request at a time per worker.
+  - ``uvicorn``: igin.asgi served by uvicorn workers, see needs.async_views.
+
+Worker and thread counts follow the cores available to the dyno unless
+WEB_CONCURRENCY and GUNICORN_THREADS are set. The application is
+preloaded in the master and each worker opens its database connections
+and cache clients before it accepts traffic, see igin/warmup.py.
+"""
+import multiprocessing
+import os
+
+if hasattr(os, 'sched_getaffinity'):
+    cores = len(os.sched_getaffinity(0))
+else:
+    cores = multiprocessing.cpu_count()
+
+worker_kind = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = 1
+if worker_kind == 'uvicorn':
+    wsgi_app = 'igin.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = cores
+elif worker_kind == 'gthread':
+    wsgi_app = 'igin.wsgi'
+    worker_class = 'gthread'
+    workers = cores + 1
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+elif worker_kind == 'sync':
+    wsgi_app = 'igin.wsgi'
+    worker_class = 'sync'
+    workers = 2 * cores + 1
+else:
+    raise RuntimeError('Unknown GUNICORN_WORKER_CLASS %r' % worker_kind)
+workers = int(os.environ.get('WEB_CONCURRENCY', workers))
+
+preload_app = True
+errorlog = '-'
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from igin import warmup
+        warmup.load_application()
+
+
+def post_worker_init(worker):
+    from igin import warmup
+    if worker_kind == 'gthread':
+        warmup.warm_threads(worker.tpool, worker.cfg.threads)
+    elif worker_kind == 'uvicorn':
+        from django.conf import settings
+        from needs.async_views import executor
+        warmup.warm_threads(executor, settings.ASYNC_VIEW_THREADS)
+    else:
+        warmup.warm_connections()
@@ -5,12 +5,22 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+
+Run with: uvicorn igin.asgi:application --workers 4
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'igin.settings')
+# read endpoints as async views running on a bounded thread pool
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'igin.asgi_urls')
+
+# what get_asgi_application() does, with the handler streaming from the pool
+django.setup(set_prefix=False)
+
+from needs.async_views import ASGIHandler, EventStreamMiddleware  # noqa: E402
 
-application = get_asgi_application()
+# events/ is streamed on the event loop, see needs.async_views
+application = EventStreamMiddleware(ASGIHandler())
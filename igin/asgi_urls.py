@@ -0,0 +1,14 @@
+"""igin URL configuration of the ASGI deployment, see igin/asgi.py.
+
+Same routes as igin.urls, with the read endpoints of the needs app served
+by the async views of needs.async_views.
+"""
+from django.contrib import admin
+from django.urls import path, include, re_path
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('needs.async_urls')),
+    re_path(r'^rest-auth/', include('rest_auth.urls')),
+    re_path(r'^rest-auth/registration/', include('rest_auth.registration.urls')),
+]
@@ -60,13 +60,75 @@ ACCOUNT_EMAIL_VERIFICATION = 'none'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Only token based schemes authenticate API requests, so no request pays for
+# a password hash; passwords are checked by the rest_auth login and
+# registration endpoints alone. Override with a comma separated list of
+# class paths in API_AUTHENTICATION_CLASSES.
+API_AUTHENTICATION_CLASSES = os.environ.get(
+    'API_AUTHENTICATION_CLASSES',
+    'needs.authentication.SignedTokenAuthentication,'
+    'needs.authentication.CachedTokenAuthentication',
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        path.strip() for path in API_AUTHENTICATION_CLASSES.split(',') if path.strip()
     ]
 }
 
+# token -> user cache of CachedTokenAuthentication. Without an alias each
+# worker keeps its own LRU for TOKEN_CACHE_LOCAL_TIMEOUT seconds, as long
+# as a logged out token stays valid on the other workers; set
+# TOKEN_CACHE_ALIAS to a cache shared by all workers so logout and
+# deactivation are seen everywhere immediately.
+TOKEN_CACHE_ALIAS = os.environ.get('TOKEN_CACHE_ALIAS')
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_LOCAL_TIMEOUT = 5
+TOKEN_CACHE_MAX_SIZE = 10000
+
+# GET responses of needs.views are cached per user in RESPONSE_CACHE_ALIAS,
+# local memory unless CACHES is pointed at a shared backend. Local entries
+# are keyed with the user's data version, so any write of the user, on any
+# worker, misses them; a shared backend invalidates by collection.
+# RESPONSE_CACHE_TIMEOUTS overrides the TTL by view name, 0 disables.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+    },
+}
+RESPONSE_CACHE_ALIAS = os.environ.get('RESPONSE_CACHE_ALIAS', 'responses')
+RESPONSE_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_TIMEOUTS = {}
+
+# threads running the ORM work of needs.async_views under ASGI
+ASYNC_VIEW_THREADS = int(os.environ.get('ASYNC_VIEW_THREADS', 8))
+
+# events/ streams, see needs.events. LocalBroker only reaches the streams
+# of its own worker, with several workers use needs.events.CacheBroker and
+# an EVENTS_CACHE_ALIAS shared by all of them.
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'needs.events.LocalBroker')
+EVENTS_BROKER_OPTIONS = {}
+if os.environ.get('EVENTS_CACHE_ALIAS'):
+    EVENTS_BROKER_OPTIONS['alias'] = os.environ['EVENTS_CACHE_ALIAS']
+# seconds a WSGI worker keeps a stream open, and between keep-alives
+EVENTS_STREAM_TIMEOUT = 300
+EVENTS_HEARTBEAT = 15
+# milliseconds clients wait before reconnecting
+EVENTS_RETRY = 3000
+EVENTS_MAX_QUEUED = 100
+
+# signed tokens of SignedTokenAuthentication, lifetimes in seconds
+ACCESS_TOKEN_LIFETIME = 300
+REFRESH_TOKEN_LIFETIME = 14 * 24 * 3600
+
+REST_AUTH_SERIALIZERS = {
+    'TOKEN_SERIALIZER': 'needs.serializers.TokenSerializer',
+}
+
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,8 +141,13 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+# X-Query-Count on every response, for benchmarks/loadtest.py; off in
+# production, it tells clients about the queries behind each endpoint
+if os.environ.get('QUERY_COUNT_HEADER'):
+    MIDDLEWARE.insert(0, 'needs.middleware.QueryCountMiddleware')
 
-ROOT_URLCONF = 'igin.urls'
+# igin/asgi.py switches to igin.asgi_urls
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'igin.urls')
 
 TEMPLATES = [
     {
@@ -156,8 +223,13 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-# provisorio
+# MD5 hashes of existing accounts still verify and are rehashed with
+# PBKDF2 on the next login.
 PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
     'django.contrib.auth.hashers.MD5PasswordHasher',
 ]
 
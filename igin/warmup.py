@@ -0,0 +1,50 @@
+"""Warm-up of the server processes before they accept traffic.
+
+Called by the hooks of gunicorn.conf.py: ``load_application`` in the
+master once the preloaded application is imported, so workers inherit
+the populated URL resolvers and DRF settings; ``warm_threads`` in every
+worker, so the first request of each thread does not pay for opening the
+database connection (kept for CONN_MAX_AGE) and cache clients.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.urls import get_resolver, reverse
+from rest_framework.settings import api_settings
+
+
+def load_application():
+    # resolvers populate their reverse tables on first use
+    get_resolver().url_patterns
+    reverse('needs:need_list')
+    for name in ('DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES',
+                 'DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES'):
+        getattr(api_settings, name)
+    # forked workers must not share the master's sockets
+    connections.close_all()
+
+
+def warm_connections():
+    """Open this thread's database connections and cache clients."""
+    for alias in connections:
+        connections[alias].ensure_connection()
+    for alias in settings.CACHES:
+        caches[alias].get('warm-up')
+
+
+def warm_threads(executor, count, timeout=30):
+    """Run ``warm_connections`` once in each of ``count`` threads of ``executor``.
+
+    Connections are per thread; the barrier keeps each task on its own
+    thread until all of them have started.
+    """
+    barrier = threading.Barrier(count, timeout=timeout)
+
+    def warm():
+        barrier.wait()
+        warm_connections()
+
+    for future in [executor.submit(warm) for _ in range(count)]:
+        future.result()
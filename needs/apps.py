@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NeedsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'needs'
+
+    def ready(self):
+        # connects the token cache invalidation signals
+        from . import authentication  # noqa: F401
@@ -0,0 +1,11 @@
+from django.urls import URLPattern
+
+from needs import urls
+from needs.async_views import READ_ROUTES, async_view
+
+app_name = urls.app_name
+urlpatterns = [
+    URLPattern(pattern.pattern, async_view(pattern.callback), pattern.default_args, pattern.name)
+    if pattern.name in READ_ROUTES else pattern
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,216 @@
+"""Async versions of the read endpoints, served by igin.asgi_urls.
+
+Under ASGI Django runs sync views with ``thread_sensitive=True``, i.e. one
+at a time on a single shared thread. These wrappers run the same views'
+GETs with ``thread_sensitive=False`` on a bounded pool instead, so up to
+``ASYNC_VIEW_THREADS`` requests use the ORM concurrently while the event
+loop keeps serving slow clients. Writes run as Django runs them.
+"""
+import asyncio
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers import asgi
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.urls import reverse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import events
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'ASYNC_VIEW_THREADS', 8),
+                              thread_name_prefix='needs-views')
+
+# names of the needs.urls routes served by async_view
+READ_ROUTES = {
+    'need_list', 'need_detail',
+    'goal_list', 'goal_list_by_need', 'goal_detail',
+    'step_list', 'step_list_by_goal', 'step_detail',
+    'iteration_list', 'iteration_detail', 'active_iteration',
+    'delivery_list', 'delivery_list_by_goal', 'delivery_list_by_step',
+    'delivery_list_by_iteration', 'delivery_detail',
+    'bootstrap',
+}
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# rendered chunks of a streamed body waiting for the client
+STREAM_QUEUE_SIZE = 4
+
+
+def render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    return response
+
+
+def run_view(view, request, *args, **kwargs):
+    # pool threads keep their own connections, recycle them like a
+    # request_started/request_finished pair would
+    close_old_connections()
+    try:
+        response = render_view(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+    if response.streaming:
+        # the ASGI handler iterates streaming content on the event loop
+        # where the ORM cannot run, ASGIHandler sends it from the pool
+        response.stream_on_pool = True
+    return response
+
+
+def async_view(view):
+    """An async view running the GETs of ``view`` on the bounded thread pool."""
+    run = sync_to_async(run_view, thread_sensitive=False, executor=executor)
+    write = sync_to_async(render_view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await run(view, request, *args, **kwargs)
+        return await write(view, request, *args, **kwargs)
+
+    # wraps() copied csrf_exempt from the DRF view
+    return wrapper
+
+
+def produce(response, chunks, loop, stop):
+    """Iterate a streamed body on a pool thread, one chunk ahead of the client."""
+    def put(chunk):
+        asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+    close_old_connections()
+    try:
+        for part in response:
+            if stop.is_set():
+                break
+            put(part)
+    finally:
+        # closes the body's generator and its cursor on the thread that
+        # opened them, then sends request_finished
+        response.close()
+        close_old_connections()
+        put(None)
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """Sends the streamed bodies of async_view from the thread pool.
+
+    A single pool thread iterates the body, so its queries keep one
+    connection and cursor, and hands the chunks to the event loop through
+    a bounded queue: a slow client holds at most STREAM_QUEUE_SIZE chunks
+    in memory, like a WSGI worker writing to its socket.
+    """
+
+    async def send_response(self, response, send):
+        if not getattr(response, 'stream_on_pool', False):
+            return await super().send_response(response, send)
+
+        headers = [(header.encode('ascii'), value.encode('latin1'))
+                   for header, value in response.items()]
+        headers += [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+                    for cookie in response.cookies.values()]
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': headers})
+
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        stop = threading.Event()
+        producer = loop.run_in_executor(executor, produce, response, chunks, loop, stop)
+        try:
+            while True:
+                part = await chunks.get()
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            # unblock the producer if the client went away mid-stream
+            stop.set()
+            while not producer.done():
+                while not chunks.empty():
+                    chunks.get_nowait()
+                await asyncio.wait([producer], timeout=0.01)
+        await producer
+
+
+def authenticated_user_id(request):
+    """The id of the user the API authentication classes find, or None."""
+    drf_request = Request(request, authenticators=[
+        authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    close_old_connections()
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    finally:
+        close_old_connections()
+    return user.pk if user.is_authenticated else None
+
+
+class EventStreamMiddleware:
+    """Serves needs.views.event_stream_view natively on the event loop.
+
+    Django 3.2 iterates streamed responses synchronously on the loop, a
+    stream waiting for events would block every other request. Here a
+    stream only costs a coroutine, so it is kept open until the client
+    goes away instead of EVENTS_STREAM_TIMEOUT.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.path = None
+
+    async def __call__(self, scope, receive, send):
+        if self.path is None:
+            self.path = reverse('needs:event_stream')
+        if scope['type'] != 'http' or scope['path'] != self.path or scope['method'] != 'GET':
+            return await self.application(scope, receive, send)
+
+        request = ASGIRequest(scope, io.BytesIO())
+        user_id = await sync_to_async(authenticated_user_id, thread_sensitive=False,
+                                      executor=executor)(request)
+        if user_id is None:
+            await send({'type': 'http.response.start', 'status': 401,
+                        'headers': [(b'content-type', b'application/json')]})
+            await send({'type': 'http.response.body',
+                        'body': b'{"detail":"Authentication credentials were not provided."}'})
+            return
+
+        subscription = events.AsyncSubscription(asyncio.get_running_loop())
+        last_id = request.META.get('HTTP_LAST_EVENT_ID')
+        # CacheBroker reads the cache to subscribe
+        await sync_to_async(events.broker.subscribe, thread_sensitive=False,
+                            executor=executor)(user_id, subscription, last_id)
+        disconnected = asyncio.ensure_future(self.disconnected(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            options = events.stream_options()
+            await send({'type': 'http.response.body', 'more_body': True,
+                        'body': b'retry: %d\n\n' % options['retry']})
+            while not disconnected.done():
+                frames = events.encode(await subscription.get(options['heartbeat']))
+                if disconnected.done():
+                    break
+                await send({'type': 'http.response.body', 'body': frames, 'more_body': True})
+        finally:
+            disconnected.cancel()
+            events.broker.unsubscribe(user_id, subscription)
+
+    async def disconnected(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
@@ -0,0 +1,225 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (BaseAuthentication, TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework.authtoken.models import Token
+
+from .models import UserState
+from .tokens import ACCESS, read_token
+
+
+class LocalTokenCache:
+    """Thread safe LRU cache whose entries expire after ``timeout`` seconds."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SharedTokenCache:
+    """Token cache stored in a Django cache, shared by every worker process."""
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(keys)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def cache_key(token_key):
+    # raw tokens never end up in a cache backend
+    return 'auth-token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def build_token_cache():
+    alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None)
+    if alias:
+        return SharedTokenCache(alias, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300))
+    # other workers never see the invalidations of this one, keep their
+    # copies short lived
+    return LocalTokenCache(getattr(settings, 'TOKEN_CACHE_MAX_SIZE', 10000),
+                           getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', 5))
+
+
+token_cache = build_token_cache()
+
+
+def invalidate_tokens(*token_keys):
+    token_cache.delete_many([cache_key(key) for key in token_keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that keeps token -> user lookups in ``token_cache``.
+
+    Without ``TOKEN_CACHE_ALIAS`` the cache lives in the process, so a
+    deleted token or deactivated user can stay valid in other workers for
+    up to ``TOKEN_CACHE_LOCAL_TIMEOUT`` seconds. Point the alias at a cache
+    shared by all workers to invalidate them everywhere at once.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(cache_key(key))
+        if token is None:
+            token = self.fetch_token(key)
+            token_cache.set(cache_key(key), token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
+
+    def fetch_token(self, key):
+        try:
+            return self.get_model().objects.select_related('user').get(key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+
+class TokenUser(SimpleLazyObject):
+    """The user of an access token, loaded from the database on first use.
+
+    The primary key and the authentication flags are known from the token,
+    so views filtering on ``request.user`` run no query for it. Reading or
+    writing any other attribute loads the real user, so views that show or
+    save it, like rest_auth's user details, work on the stored row.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, pk):
+        super().__init__(lambda: self.load(pk))
+        # LazyObject forwards attribute writes to the wrapped user
+        self.__dict__['_pk'] = pk
+
+    @staticmethod
+    def load(pk):
+        try:
+            return get_user_model().objects.get(pk=pk)
+        except get_user_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+    @property
+    def pk(self):
+        return self._pk
+
+    @property
+    def id(self):
+        return self._pk
+
+    # lets the ORM take it for a user in filters, without loading it
+    @property
+    def __class__(self):
+        return get_user_model()
+
+    @property
+    def _meta(self):
+        return get_user_model()._meta
+
+    def __getattr__(self, name):
+        # the ORM probes values for expression hooks users never have
+        if not name.startswith('_') and not hasattr(get_user_model(), name):
+            raise AttributeError(name)
+        return super().__getattr__(name)
+
+    def __bool__(self):
+        return True
+
+    def __hash__(self):
+        return hash(self._pk)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticates ``Authorization: Bearer <access token>`` without a query.
+
+    The access token is checked against SECRET_KEY only; ``request.user``
+    is a ``TokenUser`` which only reads the user row when a view uses more
+    than its primary key. Revocation takes effect when the token expires,
+    as the token version is only compared when refreshing.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+        payload = read_token(auth[1].decode(errors='replace'), ACCESS)
+        if payload is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return (TokenUser(payload['uid']), payload)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_tokens(instance.key)
+    # logging out also revokes the signed refresh tokens
+    UserState.revoke_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # cached tokens carry a copy of the user, drop it on every change
+    if not created:
+        invalidate_tokens(*Token.objects.filter(user=instance).values_list('key', flat=True))
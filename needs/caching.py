@@ -0,0 +1,128 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versioning import data_version
+
+# view name -> collections it reads, for stats
+CACHED_VIEWS = {}
+
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def is_local(cache):
+    """Whether ``cache`` lives in this process, unseen by other workers."""
+    return isinstance(cache, LocMemCache)
+
+
+def view_timeout(name, timeout):
+    timeouts = getattr(settings, 'RESPONSE_CACHE_TIMEOUTS', {})
+    if name in timeouts:
+        return timeouts[name]
+    if timeout is not None:
+        return timeout
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+
+
+def generation_key(user_id, collection):
+    return 'needs:gen:%s:%s' % (user_id, collection)
+
+
+def generations(user_id, collections):
+    """The current generation of each of the user's ``collections``.
+
+    Generations are random, so one evicted from the cache comes back as a
+    value no stored response was keyed with.
+    """
+    cache = response_cache()
+    keys = [generation_key(user_id, collection) for collection in collections]
+    found = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def invalidate(user_ids, collections):
+    response_cache().delete_many([generation_key(user_id, collection)
+                                  for user_id in user_ids for collection in collections])
+
+
+def count(outcome, name):
+    cache = response_cache()
+    key = 'needs:stats:%s:%s' % (outcome, name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def stats():
+    cache = response_cache()
+    keys = {(outcome, name): 'needs:stats:%s:%s' % (outcome, name)
+            for name in CACHED_VIEWS for outcome in ('hits', 'misses')}
+    found = cache.get_many(keys.values())
+    return {name: {outcome: found.get(keys[outcome, name], 0) for outcome in ('hits', 'misses')}
+            for name in CACHED_VIEWS}
+
+
+def cached(reads, writes=(), timeout=None):
+    """Cache the GET responses of a view per user, path and query string.
+
+    Entries are keyed with the generations of the ``reads`` collections.
+    A successful write invalidates the collections in ``writes``, either a
+    tuple or a dict by HTTP method, by dropping their generations.
+
+    A local memory cache only sees the writes of its own worker, so its
+    keys also carry ``UserState.data_version``, which every write bumps in
+    the database: a body cached before a write on another worker is never
+    served, nor given the ETag of the newer version. Any write of the user
+    then misses every entry; a shared cache keeps the finer generations.
+    """
+
+    def decorator(view):
+        name = view.__name__
+        if reads:
+            CACHED_VIEWS[name] = reads
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                response = view(request, *args, **kwargs)
+                changed = writes.get(request.method, ()) if isinstance(writes, dict) else writes
+                if changed and response.status_code < 400:
+                    invalidate([request.user.pk], changed)
+                return response
+
+            ttl = view_timeout(name, timeout)
+            if not ttl:
+                return view(request, *args, **kwargs)
+            parts = [name, str(request.user.pk), request.get_full_path(),
+                     *generations(request.user.pk, reads)]
+            if is_local(response_cache()):
+                parts.append(str(data_version(request)))
+            key = 'needs:resp:' + hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+            data = response_cache().get(key)
+            if data is not None:
+                count('hits', name)
+                return Response(data)
+
+            count('misses', name)
+            response = view(request, *args, **kwargs)
+            # streamed responses are not Response instances and are skipped
+            if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+                response_cache().set(key, response.data, ttl)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,372 @@
+"""Change events of the user's data, pushed to clients as Server-Sent Events.
+
+Write views are decorated with ``publishes``: once their transaction has
+committed, the created, updated or deleted object is handed to ``broker``,
+which passes it to every open stream of the user. ``LocalBroker`` only
+reaches the streams of its own process; set EVENTS_BROKER to
+``needs.events.CacheBroker`` and point it at a cache shared by all workers
+when running more than one.
+
+A client that missed events, because it reconnected or fell too far
+behind, is sent a ``reset`` event and refetches (cheaply, the GETs are
+conditional, see needs.versioning).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+RESET = {'type': 'reset', 'data': '{}'}
+
+
+def event(kind, **data):
+    # payloads are encoded once, whatever the number of streams
+    return {'type': kind, 'data': json.dumps(data, cls=JSONEncoder)}
+
+
+def encode(events):
+    """The SSE frames of ``events``, a keep-alive comment when empty."""
+    if not events:
+        return b': keep-alive\n\n'
+    frames = []
+    for item in events:
+        if 'id' in item:
+            frames.append('id: %s\n' % item['id'])
+        frames.append('event: %s\ndata: %s\n\n' % (item['type'], item['data']))
+    return ''.join(frames).encode()
+
+
+class Subscription:
+    """Events waiting to be sent to one stream.
+
+    Streams that fall more than ``max_queued`` events behind have them
+    replaced by a single ``reset``.
+    """
+
+    def __init__(self, max_queued=None):
+        self.max_queued = max_queued or getattr(settings, 'EVENTS_MAX_QUEUED', 100)
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.ready = threading.Event()
+
+    def push(self, events):
+        with self.lock:
+            self.pending.extend(events)
+            if len(self.pending) > self.max_queued:
+                self.pending.clear()
+                self.pending.append(RESET)
+        self.notify()
+
+    def notify(self):
+        self.ready.set()
+
+    def take(self):
+        with self.lock:
+            events = list(self.pending)
+            self.pending.clear()
+        return events
+
+    def get(self, timeout):
+        """The events pushed so far, waiting up to ``timeout`` for one."""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        return self.take()
+
+
+class AsyncSubscription(Subscription):
+    """A subscription awaited on an event loop, pushed to from any thread."""
+
+    def __init__(self, loop, max_queued=None):
+        super().__init__(max_queued)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def notify(self):
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    async def get(self, timeout):
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.ready.clear()
+        return self.take()
+
+
+class LocalBroker:
+    """Passes events to the subscriptions of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+        self.ids = itertools.count(1)
+
+    def subscribe(self, user_id, subscription, last_id=None):
+        with self.lock:
+            self.subscriptions[user_id].add(subscription)
+        if last_id is not None:
+            # nothing is kept to replay from
+            subscription.push([RESET])
+
+    def unsubscribe(self, user_id, subscription):
+        with self.lock:
+            self.subscriptions[user_id].discard(subscription)
+            if not self.subscriptions[user_id]:
+                del self.subscriptions[user_id]
+
+    def publish(self, user_id, events):
+        self.deliver(user_id, [dict(item, id=next(self.ids)) for item in events])
+
+    def deliver(self, user_id, events):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(events)
+
+
+class CacheBroker(LocalBroker):
+    """Passes events between processes through a shared cache.
+
+    Events are numbered per user with ``cache.incr`` and kept for
+    ``retention`` seconds, so a stream reconnecting with Last-Event-ID
+    gets what it missed. One thread per process polls the counters of all
+    users with open streams every ``poll_interval`` seconds, in a single
+    ``get_many``.
+    """
+
+    def __init__(self, alias='default', poll_interval=0.5, retention=300):
+        super().__init__()
+        self.alias = alias
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # user id -> number of the last event delivered in this process
+        self.positions = {}
+        self.stalled = {}
+        self.poller = None
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def counter_key(self, user_id):
+        return 'needs:events:%s' % user_id
+
+    def event_key(self, user_id, number):
+        return 'needs:events:%s:%d' % (user_id, number)
+
+    def publish(self, user_id, events):
+        key = self.counter_key(user_id)
+        self.cache.add(key, 0, timeout=None)
+        last = self.cache.incr(key, len(events))
+        numbers = range(last - len(events) + 1, last + 1)
+        self.cache.set_many({self.event_key(user_id, number): dict(item, id=number)
+                             for number, item in zip(numbers, events)},
+                            timeout=self.retention)
+
+    def subscribe(self, user_id, subscription, last_id=None):
+        current = self.cache.get(self.counter_key(user_id), 0)
+        with self.lock:
+            position = self.positions.setdefault(user_id, current)
+            self.subscriptions[user_id].add(subscription)
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.poll, name='needs-events',
+                                               daemon=True)
+                self.poller.start()
+        if last_id is not None:
+            subscription.push(self.replay(user_id, last_id, position))
+
+    def unsubscribe(self, user_id, subscription):
+        with self.lock:
+            self.subscriptions[user_id].discard(subscription)
+            if not self.subscriptions[user_id]:
+                del self.subscriptions[user_id]
+                self.positions.pop(user_id, None)
+                self.stalled.pop(user_id, None)
+
+    def replay(self, user_id, last_id, position):
+        try:
+            numbers = range(int(last_id) + 1, position + 1)
+        except ValueError:
+            return [RESET]
+        if int(last_id) > position:
+            return [RESET]
+        keys = [self.event_key(user_id, number) for number in numbers]
+        found = self.cache.get_many(keys)
+        if len(found) < len(keys):
+            return [RESET]
+        return [found[key] for key in keys]
+
+    def poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception('Polling %s for events failed', self.alias)
+
+    def poll_once(self):
+        with self.lock:
+            positions = dict(self.positions)
+        if not positions:
+            return
+        counters = self.cache.get_many([self.counter_key(user_id) for user_id in positions])
+        wanted = {}
+        for user_id, position in positions.items():
+            last = counters.get(self.counter_key(user_id), 0)
+            if last > position:
+                wanted[user_id] = range(position + 1, last + 1)
+        if not wanted:
+            return
+        found = self.cache.get_many([self.event_key(user_id, number)
+                                     for user_id, numbers in wanted.items()
+                                     for number in numbers])
+
+        for user_id, numbers in wanted.items():
+            events = []
+            for number in numbers:
+                if self.event_key(user_id, number) not in found:
+                    break
+                events.append(found[self.event_key(user_id, number)])
+            position = numbers[0] + len(events) - 1
+            if len(events) < len(numbers):
+                missing = position + 1
+                if self.stalled.get(user_id) == missing:
+                    # expired, or its publisher died between incr and set_many
+                    events.append(RESET)
+                    position = numbers[-1]
+                    self.stalled.pop(user_id)
+                else:
+                    self.stalled[user_id] = missing
+            with self.lock:
+                if user_id in self.positions:
+                    self.positions[user_id] = position
+            if events:
+                self.deliver(user_id, events)
+
+
+def build_broker():
+    backend = getattr(settings, 'EVENTS_BROKER', 'needs.events.LocalBroker')
+    return import_string(backend)(**getattr(settings, 'EVENTS_BROKER_OPTIONS', {}))
+
+
+broker = build_broker()
+
+
+def publish(user_ids, events):
+    """Publish ``events`` to each of ``user_ids`` once the transaction commits."""
+    user_ids = list(user_ids)
+
+    def send():
+        for user_id in user_ids:
+            broker.publish(user_id, events)
+
+    transaction.on_commit(send)
+
+
+def response_events(collection, request, response, kwargs):
+    data = getattr(response, 'data', None)
+    if request.method == 'DELETE' and 'pk' in kwargs:
+        return [event('deleted', collection=collection, id=kwargs['pk'])]
+    if isinstance(data, dict) and 'id' in data:
+        kind = 'created' if response.status_code == status.HTTP_201_CREATED else 'updated'
+        return [event(kind, collection=collection, object=data)]
+    if isinstance(data, list):
+        # needs.views.delivery_bulk_update_view results
+        return [event('updated', collection=collection, object=item['data'])
+                for item in data if isinstance(item, dict) and 'data' in item]
+    return []
+
+
+def publishes(collection=None, changes=()):
+    """Publish the change a write view made to the user's data.
+
+    The created, updated or deleted ``collection`` object is read from the
+    response. A ``changed`` event naming ``changes`` tells clients to
+    refetch what the response does not describe: rows moved in bulk,
+    seeded rows or counters of related collections.
+
+    Goes above ``versioned`` and ``cached``: outside of a transaction the
+    events are sent right away, and a client refetching on them must find
+    the data version bumped and the cached responses invalidated.
+    """
+
+    def decorator(view):
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if request.method == 'GET' or response.status_code >= 400:
+                return response
+            events = response_events(collection, request, response, kwargs) if collection else []
+            changed = list(changes.get(request.method, ()) if isinstance(changes, dict)
+                           else changes)
+            if collection and not events:
+                changed.insert(0, collection)
+            if changed:
+                events.append(event('changed', collections=changed))
+            publish([request.user.pk], events)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Accepts ``text/event-stream``; only errors are rendered, as JSON."""
+
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'' if data is None else JSONRenderer().render(data)
+
+
+def stream_options():
+    return {
+        'timeout': getattr(settings, 'EVENTS_STREAM_TIMEOUT', 300),
+        'heartbeat': getattr(settings, 'EVENTS_HEARTBEAT', 15),
+        'retry': getattr(settings, 'EVENTS_RETRY', 3000),
+    }
+
+
+def stream_response(user_id, last_id=None):
+    """A streamed response of the user's events.
+
+    It ends after EVENTS_STREAM_TIMEOUT seconds, so a sync worker is only
+    held that long; clients reconnect after EVENTS_RETRY milliseconds.
+    """
+    options = stream_options()
+
+    def stream():
+        subscription = Subscription()
+        broker.subscribe(user_id, subscription, last_id)
+        try:
+            yield b'retry: %d\n\n' % options['retry']
+            deadline = time.monotonic() + options['timeout']
+            while time.monotonic() < deadline:
+                yield encode(subscription.get(
+                    min(options['heartbeat'], max(deadline - time.monotonic(), 0))))
+        finally:
+            broker.unsubscribe(user_id, subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # proxies must not buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
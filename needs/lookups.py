@@ -0,0 +1,29 @@
+from django.db.models import F
+from rest_framework.exceptions import NotFound, PermissionDenied
+
+# field holding the owning user of each model
+OWNER_FIELDS = {
+    'need': 'user',
+    'goal': 'owner',
+    'step': 'owner',
+    'iteration': 'owner',
+    'delivery': 'owner',
+}
+
+
+def get_owned_object(queryset, pk, user):
+    """Fetch ``pk`` together with its owner id in a single query.
+
+    The owner is read as an annotation, so the ownership check needs no
+    further lazy loads. Raises ``NotFound`` when
+    the row does not exist and ``PermissionDenied`` when it belongs to
+    another user.
+    """
+    owner_field = OWNER_FIELDS[queryset.model._meta.model_name]
+    try:
+        instance = queryset.annotate(owner_pk=F(owner_field)).get(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise NotFound()
+    if instance.owner_pk != user.pk:
+        raise PermissionDenied()
+    return instance
@@ -0,0 +1,139 @@
+import time
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from rest_framework.authtoken.models import Token
+
+from needs.models import ITERATION_LENGTH, Delivery, Goal, Iteration, Need, Step, UserState
+
+MODELS = [User, UserState, Need, Goal, Step, Iteration, Delivery]
+
+
+class Writer:
+    """Buffers rows per model and writes them with ``bulk_create`` batches.
+
+    Primary keys are assigned here, continuing after the current maximum,
+    so rows can reference each other without reading ids back.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.next_pk = {model: (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+                        for model in MODELS}
+        self.pending = {model: [] for model in MODELS + [Token]}
+        self.written = {model: 0 for model in MODELS + [Token]}
+
+    def add(self, obj):
+        model = type(obj)
+        if model in self.next_pk:
+            obj.pk = self.next_pk[model]
+            self.next_pk[model] += 1
+        self.pending[model].append(obj)
+        return obj
+
+    def flush(self):
+        # parents first, deliveries adjust the counters of their steps
+        for model in [User, Token] + MODELS[1:]:
+            objs = self.pending[model]
+            for start in range(0, len(objs), self.batch_size):
+                model.objects.bulk_create(objs[start:start + self.batch_size])
+            self.written[model] += len(objs)
+            self.pending[model] = []
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic users with needs, goals, steps, deliveries and '
+            'iterations for load tests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--needs', type=int, default=5, help='Needs per user.')
+        parser.add_argument('--goals', type=int, default=4, help='Goals per need.')
+        parser.add_argument('--steps', type=int, default=5, help='Steps per goal.')
+        parser.add_argument('--deliveries', type=int, default=10, help='Deliveries per step.')
+        parser.add_argument('--iterations', type=int, default=10,
+                            help='Iterations per user, the last one active.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk_create.')
+        parser.add_argument('--users-per-transaction', type=int, default=50)
+        parser.add_argument('--prefix', default='load',
+                            help='Usernames are <prefix>-<user id>.')
+        parser.add_argument('--password', default='load',
+                            help='Password of every generated user.')
+        parser.add_argument('--staff', type=int, default=0,
+                            help='Generated users that are staff, the first ones.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        writer = Writer(options['batch_size'])
+        # hashed once, every generated user shares it
+        password = make_password(options['password'])
+        users = options['users']
+        chunk = options['users_per_transaction']
+
+        for first in range(0, users, chunk):
+            with transaction.atomic():
+                for index in range(first, min(first + chunk, users)):
+                    self.generate_user(writer, password, options,
+                                       staff=index < options['staff'])
+                writer.flush()
+            self.stdout.write('%d/%d users' % (min(first + chunk, users), users))
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), MODELS):
+                cursor.execute(sql)
+
+        elapsed = time.monotonic() - started
+        rows = sum(writer.written.values())
+        for model, count in writer.written.items():
+            self.stdout.write('%-12s %d' % (model.__name__, count))
+        self.stdout.write(self.style.SUCCESS('Generated %d rows in %.1fs (%.0f rows/s).' % (
+            rows, elapsed, rows / elapsed if elapsed else 0)))
+
+    def generate_user(self, writer, password, options, staff=False):
+        user = writer.add(User(username='', password=password, is_staff=staff))
+        user.username = '%s-%d' % (options['prefix'], user.pk)
+        writer.add(Token(key=Token.generate_key(), user_id=user.pk))
+        writer.add(UserState(user_id=user.pk))
+
+        today = date.today()
+        count = options['iterations']
+        iterations = [writer.add(Iteration(
+            number=number, completed=number < count - 1, owner_id=user.pk,
+            date=today - ITERATION_LENGTH * (count - 2 - number))) for number in range(count)]
+        past, active = iterations[:-1], iterations[-1] if iterations else None
+
+        index = 0
+        for n in range(options['needs']):
+            need = writer.add(Need(name='need %d' % n, description='generated',
+                                   user_id=user.pk, iconName='far fa-heart',
+                                   iconColor='bg-red-500'))
+            # parents are passed as instances, bulk_create resolves the
+            # owner of each row from them without a query
+            for g in range(options['goals']):
+                goal = writer.add(Goal(name='goal %d' % g, description='generated',
+                                       need=need, owner_id=user.pk))
+                for s in range(options['steps']):
+                    step = writer.add(Step(name='step %d' % s, description='generated',
+                                           completed=s % 4 == 0, goal=goal,
+                                           owner_id=user.pk))
+                    for d in range(options['deliveries']):
+                        index += 1
+                        # a third done in past iterations, the rest split
+                        # between the active iteration and the backlog
+                        completed = index % 3 == 0
+                        if completed and past:
+                            iteration = past[index % len(past)]
+                        elif index % 2 and active:
+                            iteration = active
+                        else:
+                            iteration = None
+                        writer.add(Delivery(
+                            name='delivery %d' % d, description='generated',
+                            completed=completed, step=step, owner_id=user.pk,
+                            iteration=iteration))
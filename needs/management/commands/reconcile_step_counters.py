@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from needs.models import Delivery, Step
+
+
+class Command(BaseCommand):
+    help = 'Detect and repair drift in Step.deliveries_total/deliveries_completed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of steps checked per query.')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drifted steps, do not repair them.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checked = drifted = 0
+        last_pk = 0
+        while True:
+            stored = {pk: (total, completed) for pk, total, completed in
+                      Step.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                          'pk', 'deliveries_total', 'deliveries_completed')[:chunk_size]}
+            if not stored:
+                break
+            last_pk = max(stored)
+            checked += len(stored)
+
+            actual = Delivery.objects.filter(step__in=stored).step_counts()
+            wrong = [pk for pk, counts in stored.items()
+                     if counts != actual.get(pk, (0, 0))]
+            if not wrong:
+                continue
+            drifted += len(wrong)
+            for pk in wrong:
+                self.stdout.write('step %s: stored %s, actual %s' % (
+                    pk, stored[pk], actual.get(pk, (0, 0))), self.style.WARNING)
+            if not options['check']:
+                with transaction.atomic():
+                    Step.objects.filter(pk__in=wrong).recount_deliveries()
+
+        action = 'found' if options['check'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(
+            'Checked %d steps, %s %d with drifted counters.' % (checked, action, drifted)))
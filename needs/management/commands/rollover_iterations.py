@@ -0,0 +1,103 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from needs import events
+from needs.caching import invalidate
+from needs.models import ITERATION_LENGTH, Delivery, Iteration, UserState
+
+
+def due_iterations(today):
+    return Iteration.objects.filter(completed=False, date__lt=today, owner__isnull=False)
+
+
+def rollover_chunk(today, first_owner, last_owner, chunk_size):
+    """Roll over up to ``chunk_size`` due iterations of owners in the range.
+
+    Returns ``(rolled, last_owner_seen)``. The chunk is closed, replaced
+    and has its open deliveries moved with three statements, whatever
+    its size; the owners' data versions and cached responses are
+    invalidated and their streams told to refetch.
+    """
+    with transaction.atomic():
+        due = due_iterations(today).filter(
+            owner_id__gte=first_owner, owner_id__lte=last_owner).order_by('owner_id')
+        if connection.features.has_select_for_update_skip_locked:
+            # rows locked by a concurrent per-user rollover are left to it
+            due = due.select_for_update(skip_locked=True)
+        rows = list(due.values_list('pk', 'owner_id', 'number')[:chunk_size])
+        if not rows:
+            return 0, None
+
+        Iteration.objects.filter(pk__in=[pk for pk, owner_id, number in rows]).update(
+            completed=True)
+        Iteration.objects.bulk_create([
+            Iteration(number=number + 1, completed=False,
+                      date=today + ITERATION_LENGTH, owner_id=owner_id)
+            for pk, owner_id, number in rows])
+        active = Iteration.objects.filter(owner=OuterRef('owner'), completed=False)
+        Delivery.objects.filter(
+            iteration__in=[pk for pk, owner_id, number in rows], completed=False
+        ).update(iteration=Subquery(active.values('pk')[:1]))
+        owners = [owner_id for pk, owner_id, number in rows]
+        UserState.bump_data_version(owners)
+        invalidate(owners, ('iteration', 'delivery'))
+        events.publish(owners, [events.event('changed', collections=['iteration', 'delivery'])])
+    return len(rows), rows[-1][1]
+
+
+def rollover_shard(today, first_owner, last_owner, chunk_size):
+    rolled = 0
+    while True:
+        count, last_seen = rollover_chunk(today, first_owner, last_owner, chunk_size)
+        if not count:
+            return rolled
+        rolled += count
+        first_owner = last_seen + 1
+
+
+def shards(first_owner, last_owner, count):
+    """Split the owner id range into ``count`` contiguous inclusive ranges."""
+    width = -(-(last_owner - first_owner + 1) // count)
+    return [(start, min(start + width - 1, last_owner))
+            for start in range(first_owner, last_owner + 1, width)]
+
+
+class Command(BaseCommand):
+    help = 'Roll over every active iteration whose date has passed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of iterations rolled over per transaction.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes sharing the owner id space.')
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Roll over iterations dated before this day (YYYY-MM-DD), '
+                                 'defaults to today.')
+
+    def handle(self, *args, **options):
+        today = options['date'] or date.today()
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stderr.write('SQLite allows a single writer, ignoring --workers.')
+            workers = 1
+        bounds = due_iterations(today).aggregate(first=Min('owner_id'), last=Max('owner_id'))
+        if bounds['first'] is None:
+            rolled = 0
+        elif workers == 1:
+            rolled = rollover_shard(today, bounds['first'], bounds['last'], chunk_size)
+        else:
+            # each worker opens its own connections
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+                futures = [pool.submit(rollover_shard, today, first, last, chunk_size)
+                           for first, last in shards(bounds['first'], bounds['last'],
+                                                     workers)]
+                rolled = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS('Rolled over %d iterations.' % rolled))
@@ -0,0 +1,46 @@
+import contextvars
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# list holding the number of queries of the current request
+queries = contextvars.ContextVar('needs_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class QueryCountMiddleware:
+    """Reports the number of database queries of a request in X-Query-Count.
+
+    Queries are counted on every connection, including those of the
+    threads running needs.async_views, which inherit the request context.
+    Queries run while a streamed response is sent are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # connections opened before this middleware was loaded
+        for connection in connections.all():
+            install_query_counter(None, connection)
+        counter = [0]
+        token = queries.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            queries.reset(token)
+        response['X-Query-Count'] = str(counter[0])
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.5 on 2026-10-17 07:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 1000
+
+
+def count_deliveries(apps, schema_editor):
+    Step = apps.get_model('needs', 'Step')
+    Delivery = apps.get_model('needs', 'Delivery')
+    deliveries = Delivery.objects.filter(
+        step=OuterRef('pk')).order_by().values('step')
+    total = deliveries.annotate(count=Count('pk')).values('count')
+    completed = deliveries.filter(completed=True).annotate(
+        count=Count('pk')).values('count')
+
+    last_pk = 0
+    while True:
+        pks = list(Step.objects.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not pks:
+            break
+        Step.objects.filter(pk__in=pks).update(
+            deliveries_total=Coalesce(Subquery(total), 0),
+            deliveries_completed=Coalesce(Subquery(completed), 0))
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('needs', '0021_alter_delivery_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='step',
+            name='deliveries_completed',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='deliveries_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_deliveries, migrations.RunPython.noop),
+    ]
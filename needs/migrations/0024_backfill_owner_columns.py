@@ -0,0 +1,48 @@
+# Generated by Django 3.2.5 on 2026-10-17 08:10
+
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 1000
+
+
+def update_in_chunks(model, **values):
+    # each chunk commits on its own so large tables are not locked at once
+    last_pk = 0
+    while True:
+        pks = list(model.objects.filter(pk__gt=last_pk, owner__isnull=True).order_by(
+            'pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not pks:
+            break
+        with transaction.atomic():
+            model.objects.filter(pk__in=pks).update(**values)
+        last_pk = pks[-1]
+
+
+def backfill_owners(apps, schema_editor):
+    Need = apps.get_model('needs', 'Need')
+    Goal = apps.get_model('needs', 'Goal')
+    Step = apps.get_model('needs', 'Step')
+    Iteration = apps.get_model('needs', 'Iteration')
+    Delivery = apps.get_model('needs', 'Delivery')
+
+    update_in_chunks(Goal, owner=Subquery(
+        Need.objects.filter(pk=OuterRef('need')).values('user')[:1]))
+    update_in_chunks(Step, owner=Subquery(
+        Goal.objects.filter(pk=OuterRef('goal')).values('owner')[:1]))
+    update_in_chunks(Delivery, owner=Coalesce(
+        Subquery(Step.objects.filter(pk=OuterRef('step')).values('owner')[:1]),
+        Subquery(Iteration.objects.filter(pk=OuterRef('iteration')).values('owner')[:1])))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('needs', '0023_owner_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.5 on 2026-10-17 08:40
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def close_duplicate_active_iterations(apps, schema_editor):
+    # keep the most recent active iteration of each owner before the
+    # one-active-iteration constraint is added
+    Iteration = apps.get_model('needs', 'Iteration')
+    owners = Iteration.objects.filter(completed=False, owner__isnull=False).values(
+        'owner').annotate(active=Count('pk')).filter(active__gt=1).values_list('owner', flat=True)
+    for owner in owners:
+        active = Iteration.objects.filter(owner=owner, completed=False).order_by('-number', '-pk')
+        Iteration.objects.filter(pk__in=list(active.values_list('pk', flat=True)[1:])).update(
+            completed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('needs', '0024_backfill_owner_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_active_iterations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.5 on 2026-10-17 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('needs', '0025_close_duplicate_active_iterations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['step', 'completed'], name='delivery_step_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['iteration', 'completed'], name='delivery_iteration_complet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='iteration',
+            index=models.Index(fields=['owner', 'completed'], name='iteration_owner_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='step',
+            index=models.Index(fields=['goal', 'completed'], name='step_goal_completed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='iteration',
+            constraint=models.UniqueConstraint(condition=models.Q(('completed', False)), fields=('owner',), name='iteration_one_active_per_owner'),
+        ),
+    ]
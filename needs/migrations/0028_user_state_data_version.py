@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('needs', '0027_user_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstate',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
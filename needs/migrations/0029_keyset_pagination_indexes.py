@@ -0,0 +1,33 @@
+# Generated by Django 3.2.5 on 2026-10-17 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('needs', '0028_user_state_data_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['owner', 'id'], name='delivery_owner_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['owner', 'id'], name='goal_owner_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='iteration',
+            index=models.Index(fields=['owner', 'date', 'id'], name='iteration_owner_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='need',
+            index=models.Index(fields=['user', 'id'], name='need_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='step',
+            index=models.Index(fields=['owner', 'id'], name='step_owner_id_idx'),
+        ),
+    ]
@@ -1,11 +1,45 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
-from datetime import date
+from datetime import date, timedelta
 from django.utils import timezone
 
 # Create your models here.
 
 
+class OwnedQuerySetMixin:
+    """Fills the denormalized ``owner`` column on bulk inserts."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.resolve_owner()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class ProgressQuerySet(models.QuerySet):
+    """Rolls the Step delivery counters up to goals and needs."""
+
+    step_path = None
+
+    def with_progress(self):
+        return self.annotate(
+            step_count=Count(self.step_path),
+            deliveries_total=Coalesce(
+                Sum(self.step_path + '__deliveries_total'), 0),
+            deliveries_completed=Coalesce(
+                Sum(self.step_path + '__deliveries_completed'), 0))
+
+
+class NeedQuerySet(ProgressQuerySet):
+    step_path = 'goal__step'
+
+
+class GoalQuerySet(OwnedQuerySetMixin, ProgressQuerySet):
+    step_path = 'step'
+
+
 class Need(models.Model):
     name = models.CharField(max_length=30)
     description = models.CharField(max_length=80, default='')
@@ -13,6 +47,14 @@ class Need(models.Model):
     iconName = models.CharField(max_length=20, null=True)
     iconColor = models.CharField(max_length=17, null=True)
 
+    objects = NeedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pages of the list view, see needs.pagination
+            models.Index(fields=['user', 'id'], name='need_user_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -22,6 +64,51 @@ class Goal(models.Model):
     description = models.CharField(max_length=80, default='')
     endDate = models.DateField(auto_now_add=False, null=True)
     need = models.ForeignKey(Need, on_delete=models.CASCADE)
+    # copy of need.user so list views filter without joins
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
+
+    objects = GoalQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='goal_owner_id_idx'),
+        ]
+
+    def resolve_owner(self):
+        if self.need_id is not None:
+            self.owner_id = self.need.user_id
+
+    def save(self, *args, **kwargs):
+        self.resolve_owner()
+        super().save(*args, **kwargs)
+
+
+class StepQuerySet(OwnedQuerySetMixin, models.QuerySet):
+
+    def adjust_delivery_counts(self, deltas):
+        """Apply {step_id: (total, completed)} deltas in a single UPDATE."""
+        deltas = {pk: delta for pk, delta in deltas.items()
+                  if pk is not None and delta != (0, 0)}
+        if not deltas:
+            return 0
+        total = Case(*[When(pk=pk, then=Value(delta[0]))
+                       for pk, delta in deltas.items()], default=Value(0))
+        completed = Case(*[When(pk=pk, then=Value(delta[1]))
+                           for pk, delta in deltas.items()], default=Value(0))
+        return self.filter(pk__in=deltas).update(
+            deliveries_total=F('deliveries_total') + total,
+            deliveries_completed=F('deliveries_completed') + completed)
+
+    def recount_deliveries(self):
+        """Recompute the stored counters from the delivery table."""
+        deliveries = Delivery.objects.filter(
+            step=OuterRef('pk')).order_by().values('step')
+        total = deliveries.annotate(count=Count('pk')).values('count')
+        completed = deliveries.filter(completed=True).annotate(
+            count=Count('pk')).values('count')
+        return self.update(
+            deliveries_total=Coalesce(Subquery(total), 0),
+            deliveries_completed=Coalesce(Subquery(completed), 0))
 
 
 class Step(models.Model):
@@ -29,6 +116,40 @@ class Step(models.Model):
     description = models.CharField(max_length=80, default='')
     completed = models.BooleanField(default=False)
     goal = models.ForeignKey(Goal, on_delete=models.CASCADE)
+    # copy of goal.owner so list views filter without joins
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
+    # maintained by Delivery writes, see Delivery.save and DeliveryQuerySet
+    deliveries_total = models.PositiveIntegerField(default=0, editable=False)
+    deliveries_completed = models.PositiveIntegerField(
+        default=0, editable=False)
+
+    objects = StepQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['goal', 'completed'], name='step_goal_completed_idx'),
+            models.Index(fields=['owner', 'id'], name='step_owner_id_idx'),
+        ]
+
+    COUNTER_FIELDS = ('deliveries_total', 'deliveries_completed')
+
+    def resolve_owner(self):
+        if self.goal_id is not None:
+            self.owner_id = self.goal.owner_id
+
+    def save(self, *args, **kwargs):
+        self.resolve_owner()
+        # never write back counters read earlier, deliveries may have
+        # changed them in the meantime
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
+
+# an iteration ends this long after it starts
+ITERATION_LENGTH = timedelta(days=5)
 
 
 class Iteration(models.Model):
@@ -37,6 +158,123 @@ class Iteration(models.Model):
     date = models.DateField(auto_now_add=False, null=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'completed'], name='iteration_owner_completed_idx'),
+            models.Index(fields=['owner', 'date', 'id'], name='iteration_owner_date_id_idx'),
+        ]
+        constraints = [
+            # iteration_get_active_view expects a single active iteration
+            models.UniqueConstraint(fields=['owner'], condition=Q(completed=False),
+                                    name='iteration_one_active_per_owner'),
+        ]
+
+    def rollover(self):
+        """Close this iteration and start the next one with its open deliveries.
+
+        Runs in one transaction with a fixed number of queries; open
+        deliveries move over in a single UPDATE.
+        """
+        with transaction.atomic():
+            # closed first, the next iteration becomes the active one
+            Iteration.objects.filter(pk=self.pk).update(completed=True)
+            self.completed = True
+            following = Iteration.objects.create(
+                number=self.number + 1, completed=False,
+                date=date.today() + ITERATION_LENGTH, owner_id=self.owner_id)
+            Delivery.objects.filter(iteration=self, completed=False).update(
+                iteration=following)
+        return following
+
+    def delete(self, *args, **kwargs):
+        # deliveries are removed by cascade, their steps survive
+        with transaction.atomic():
+            deltas = Delivery.objects.filter(iteration=self).step_counts()
+            result = super().delete(*args, **kwargs)
+            Step.objects.adjust_delivery_counts(_negate(deltas))
+        return result
+
+
+def _negate(deltas):
+    return {pk: (-total, -completed) for pk, (total, completed) in deltas.items()}
+
+
+def _merge(*deltas):
+    merged = {}
+    for delta in deltas:
+        for pk, (total, completed) in delta.items():
+            current = merged.get(pk, (0, 0))
+            merged[pk] = (current[0] + total, current[1] + completed)
+    return merged
+
+
+class DeliveryQuerySet(OwnedQuerySetMixin, models.QuerySet):
+    """Keeps Step.deliveries_total/deliveries_completed in sync with writes."""
+
+    COUNTED_FIELDS = {'step', 'step_id', 'completed'}
+
+    def step_counts(self):
+        rows = self.order_by().values('step').annotate(
+            total=Count('pk'), completed=Count('pk', filter=Q(completed=True)))
+        return {row['step']: (row['total'], row['completed']) for row in rows}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        deltas = _merge(*[{obj.step_id: (1, int(obj.completed))} for obj in objs])
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            Step.objects.adjust_delivery_counts(deltas)
+        for obj in objs:
+            obj._counted = (obj.step_id, obj.completed)
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            deltas = self.step_counts()
+            result = super().delete()
+            Step.objects.adjust_delivery_counts(_negate(deltas))
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        # each batch goes through update() below, which adjusts the counters
+        objs = list(objs)
+        result = super().bulk_update(objs, fields, *args, **kwargs)
+        for obj in objs:
+            obj._counted = (obj.step_id, obj.completed)
+        return result
+
+    bulk_update.alters_data = True
+
+    def update(self, **kwargs):
+        if not self.COUNTED_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            changed = Delivery.objects.filter(pk__in=pks)
+            before = changed.step_counts()
+            rows = super().update(**kwargs)
+            Step.objects.adjust_delivery_counts(
+                _merge(changed.step_counts(), _negate(before)))
+        return rows
+
+    update.alters_data = True
+
+    def plan_iteration(self, iteration_id, add=(), remove=()):
+        """Move ``add`` into the iteration and ``remove`` back to the backlog.
+
+        Runs as a single UPDATE; ``remove`` only touches deliveries that are
+        currently in the iteration.
+        """
+        iteration = Case(When(pk__in=list(add), then=Value(iteration_id)),
+                         default=Value(None), output_field=models.BigIntegerField())
+        return self.filter(Q(pk__in=list(add)) | Q(pk__in=list(remove), iteration=iteration_id)
+                           ).update(iteration=iteration)
+
+    plan_iteration.alters_data = True
+
 
 class Delivery(models.Model):
     name = models.CharField(max_length=60)
@@ -46,3 +284,116 @@ class Delivery(models.Model):
     iteration = models.ForeignKey(
         Iteration, on_delete=models.CASCADE, null=True)
     completed = models.BooleanField(default=False)
+    # copy of step.owner (or iteration.owner for deliveries without a step)
+    # so list views filter without joins
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
+
+    objects = DeliveryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['step', 'completed'], name='delivery_step_completed_idx'),
+            models.Index(fields=['iteration', 'completed'],
+                         name='delivery_iteration_complet_idx'),
+            models.Index(fields=['owner', 'id'], name='delivery_owner_id_idx'),
+        ]
+
+    # (step_id, completed) as currently reflected in the step counters
+    _counted = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'step_id' in instance.__dict__ and 'completed' in instance.__dict__:
+            instance._counted = (instance.step_id, instance.completed)
+        return instance
+
+    def resolve_owner(self):
+        if self.step_id is not None:
+            parent = self.step
+        elif self.iteration_id is not None:
+            parent = self.iteration
+        else:
+            return
+        if parent.owner_id is not None:
+            self.owner_id = parent.owner_id
+
+    def save(self, *args, **kwargs):
+        self.resolve_owner()
+        deltas = {self.step_id: (1, int(self.completed))}
+        if self._counted is None and not self._state.adding:
+            self._counted = Delivery.objects.filter(pk=self.pk).values_list(
+                'step_id', 'completed').first()
+        if self._counted is not None:
+            step_id, completed = self._counted
+            deltas = _merge(deltas, {step_id: (-1, -int(completed))})
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Step.objects.adjust_delivery_counts(deltas)
+        self._counted = (self.step_id, self.completed)
+
+    def delete(self, *args, **kwargs):
+        step_id, completed = self._counted or (self.step_id, self.completed)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Step.objects.adjust_delivery_counts(
+                {step_id: (-1, -int(completed))})
+        self._counted = None
+        return result
+
+
+class UserState(models.Model):
+    """Per-user counters read outside the request hot path."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='state')
+    # embedded in signed tokens; bumping it revokes every refresh token
+    token_version = models.PositiveIntegerField(default=0)
+    # bumped by every write to the user's data, the ETag of their GETs
+    data_version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def token_version_of(cls, user):
+        return cls.objects.get_or_create(user_id=user.pk)[0].token_version
+
+    @classmethod
+    def data_version_of(cls, user_id):
+        return cls.objects.filter(user_id=user_id).values_list(
+            'data_version', flat=True).first() or 0
+
+    @classmethod
+    def bump_data_version(cls, user_ids):
+        user_ids = set(user_ids)
+        bumped = cls.objects.filter(user_id__in=user_ids)
+        if bumped.update(data_version=F('data_version') + 1) < len(user_ids):
+            # first write of some users; bumping the others twice is harmless
+            cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids],
+                                    ignore_conflicts=True)
+            bumped.update(data_version=F('data_version') + 1)
+
+    @classmethod
+    def revoke_tokens(cls, user_id):
+        # no row means no signed tokens were ever issued
+        cls.objects.filter(user_id=user_id).update(token_version=F('token_version') + 1)
+
+
+class SpentRefreshToken(models.Model):
+    """The ``jti`` of every refresh token exchanged, so each works once."""
+
+    jti = models.CharField(max_length=32, primary_key=True)
+    spent_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    @classmethod
+    def spend(cls, jti, max_age):
+        """Mark a refresh token as used; False if it already was.
+
+        Tokens older than ``max_age`` seconds are expired anyway, their
+        rows are dropped on the way.
+        """
+        cls.objects.filter(spent_at__lt=timezone.now() - timedelta(seconds=max_age)).delete()
+        try:
+            # the primary key settles concurrent refreshes with one token
+            with transaction.atomic():
+                cls.objects.create(jti=jti)
+        except IntegrityError:
+            return False
+        return True
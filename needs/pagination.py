@@ -0,0 +1,93 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+
+class KeysetPagination:
+    """Opt-in cursor pagination over an indexed ordering.
+
+    Pages are selected with a ``WHERE key > last_key`` condition instead of
+    an OFFSET, so every page costs the same. The cursor is the base64 encoded
+    ordering key of the last row of the previous page. Nullable ordering
+    fields sort last.
+    """
+
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=('id',)):
+        self.ordering = tuple(ordering)
+        self.next_cursor = None
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.page_size_query_param in params or self.cursor_query_param in params
+
+    def order_queryset(self, queryset):
+        return queryset.order_by(
+            *[F(name).asc(nulls_last=True) for name in self.ordering])
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request):
+        page_size = self.get_page_size(request)
+        queryset = self.order_queryset(queryset)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(
+                queryset.model, self.decode_cursor(queryset.model, cursor)))
+
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        if len(rows) > page_size:
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.next_cursor, 'results': data})
+
+    def after(self, model, position):
+        """Rows strictly after ``position`` in the (nulls last) ordering."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for name, value in zip(self.ordering, position):
+            nullable = model._meta.get_field(name).null
+            if value is not None:
+                greater = Q(**{name + '__gt': value})
+                if nullable:
+                    greater |= Q(**{name + '__isnull': True})
+                condition |= equal & greater
+                equal &= Q(**{name: value})
+            else:
+                equal &= Q(**{name + '__isnull': True})
+        return condition
+
+    def encode_cursor(self, instance):
+        position = []
+        for name in self.ordering:
+            value = getattr(instance, instance._meta.get_field(name).attname)
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, model, cursor):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError(cursor)
+            return [None if value is None else model._meta.get_field(name).to_python(value)
+                    for name, value in zip(self.ordering, position)]
+        except (binascii.Error, ValueError, TypeError, ValidationError) as error:
+            raise NotFound(self.invalid_cursor_message) from error
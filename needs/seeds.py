@@ -0,0 +1,196 @@
+"""Seed data of new accounts and the engine that inserts it.
+
+A template is a list of rows. Field values may reference a row of the
+same seeding run (``Ref``), an existing row of the user (``Lookup``) or
+be callables evaluated at seeding time. A row with ``unless`` is left out
+when that ``Lookup`` matches a row of the user. ``apply`` inserts every
+model of a template with one ``bulk_create``, so its cost does not depend
+on the size of the template.
+"""
+from collections import namedtuple
+from datetime import date
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+
+from .lookups import OWNER_FIELDS
+from .models import ITERATION_LENGTH, Delivery, Goal, Iteration, Need, Step, UserState
+
+Ref = namedtuple('Ref', 'key')
+Lookup = namedtuple('Lookup', 'model filters')
+
+
+class Row:
+
+    def __init__(self, model, key=None, unless=None, **fields):
+        self.model = model
+        self.key = key
+        # Lookup of an existing row that stands in for this one
+        self.unless = unless
+        self.fields = fields
+
+
+class Template:
+
+    def __init__(self, name, done_if, rows):
+        self.name = name
+        # (model, filters) matching a row the template creates
+        self.done_if = done_if
+        self.rows = rows
+
+    def is_applied(self, user):
+        model, filters = self.done_if
+        return model.objects.filter(**{OWNER_FIELDS[model._meta.model_name]: user},
+                                    **filters).exists()
+
+
+def iteration_end():
+    return date.today() + ITERATION_LENGTH
+
+
+ACTIVE_ITERATION = Lookup(Iteration, {'completed': False})
+
+WIZARD = Template('wizard', done_if=(Need, {}), rows=[
+    Row(Need, name='Health', description='need1 description',
+        iconName='far fa-heart', iconColor='bg-red-500'),
+    Row(Need, name='Finance', description='need2 description',
+        iconName='far fa-chart-bar', iconColor='bg-red-500'),
+    Row(Need, name='Professional', description='need3 description',
+        iconName='fas fa-user-tie', iconColor='bg-red-500'),
+    Row(Need, name='Mind', description='need4 description',
+        iconName='fas fa-code-branch', iconColor='bg-red-500'),
+    Row(Need, name='Others', description='need5 description',
+        iconName='far fa-handshake', iconColor='bg-red-500'),
+    # at most one active iteration per user, an account without needs may have one
+    Row(Iteration, unless=ACTIVE_ITERATION, number=0, completed=False, date=iteration_end),
+])
+
+TUTORIAL = Template('tutorial', done_if=(Goal, {'name': 'tutorial'}), rows=[
+    Row(Goal, 'tutorial', name='tutorial', description='tutorial', endDate=None,
+        need=Lookup(Need, {'name': 'Others'})),
+
+    Row(Step, 'check', name='Learn To Check', description='d', goal=Ref('tutorial')),
+    Row(Step, 'goals', name='Learn About The Goals', description='d', goal=Ref('tutorial')),
+    Row(Step, 'steps', name='Learn About The Steps', description='d', goal=Ref('tutorial')),
+    Row(Step, 'iterations', name='Learn About The Iterations', description='d',
+        goal=Ref('tutorial')),
+
+    Row(Delivery, name='Welcome to IginApp', description="Be welcome, we'll try our best",
+        step=Ref('check'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name='Mark a task as completed by checking the side box!',
+        description='You can mark a task as completed by checking the side box!',
+        step=Ref('check'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name='Check us when you complete the task',
+        description='Check us when you complete the task',
+        step=Ref('check'), iteration=ACTIVE_ITERATION),
+
+    Row(Delivery, name='Our Needs are Health, Mind,Financial,Professional and Others',
+        description="that's right", step=Ref('goals'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name='The App is based on Goals and Needs',
+        description='The App is based on Goals and Needs',
+        step=Ref('goals'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name='Click the tutorial Goal on the side Goal box!',
+        description='Click the tutorial Goal on the side Goal box!',
+        step=Ref('goals'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name='We need to complete some steps to complete the goal!',
+        description='We need to complete some steps to complete the goal',
+        step=Ref('goals'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name='The second Step is Ok with this task!', description='Done',
+        step=Ref('goals'), iteration=ACTIVE_ITERATION),
+
+    Row(Delivery, name='Click the learn step step', description='Click the learn step step',
+        step=Ref('steps'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name='Each Step is composed of tasks!',
+        description='Each Step is composed of tasks!',
+        step=Ref('steps'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name="To add a new task on a step click the 'add new' button",
+        description='Hope you are doing good', step=Ref('steps'), iteration=ACTIVE_ITERATION),
+    Row(Delivery, name="To define a task to be done click 'Add' on the side",
+        description='Right now the task is going to show up in the to-do box',
+        step=Ref('steps'), iteration=None),
+    Row(Delivery, name='You can remove a task from your todo list by clicking remove',
+        description="You can remove a task from your to-do list by clicking 'remove'",
+        step=Ref('steps'), iteration=None),
+    Row(Delivery, name='You can click the task name to edit!',
+        description='You can click the task name to edit!', step=Ref('steps'), iteration=None),
+])
+
+
+def materialize(user, rows):
+    created = {}
+    found = {}
+
+    def find(lookup):
+        if id(lookup) not in found:
+            owner = OWNER_FIELDS[lookup.model._meta.model_name]
+            found[id(lookup)] = lookup.model.objects.filter(
+                **{owner: user}, **lookup.filters).order_by('pk').first()
+        return found[id(lookup)]
+
+    def resolve(value):
+        if isinstance(value, Ref):
+            return created[value.key]
+        if isinstance(value, Lookup):
+            if find(value) is None:
+                raise value.model.DoesNotExist(value)
+            return find(value)
+        return value() if callable(value) else value
+
+    kept = []
+    for row in rows:
+        existing = find(row.unless) if row.unless else None
+        if existing is None:
+            kept.append(row)
+        elif row.key:
+            created[row.key] = existing
+    rows = kept
+
+    models = []
+    for row in rows:
+        if row.model not in models:
+            models.append(row.model)
+    for model in models:
+        owner = OWNER_FIELDS[model._meta.model_name]
+        batch = [row for row in rows if row.model is model]
+        objs = [model(**{owner: user},
+                      **{name: resolve(value) for name, value in row.fields.items()})
+                for row in batch]
+        objs = model.objects.bulk_create(objs)
+        referenced = any(row.key for row in batch)
+        if referenced and not connection.features.can_return_rows_from_bulk_insert:
+            # the user's rows are locked, so ours are the newest ones
+            pks = list(model.objects.filter(**{owner: user}).order_by('-pk').values_list(
+                'pk', flat=True)[:len(objs)])
+            for obj, pk in zip(objs, reversed(pks)):
+                obj.pk = pk
+                obj._state.adding = False
+        for row, obj in zip(batch, objs):
+            if row.key:
+                created[row.key] = obj
+    return created
+
+
+def apply(user, *templates):
+    """Insert the templates not yet applied for ``user`` in one transaction.
+
+    The user's UserState row is locked first, so concurrent submissions
+    for the same user run one after the other and the second one finds
+    the templates applied. A template whose ``Lookup`` matches no row of
+    the user, like the tutorial of an account without an "Others" need or
+    an active iteration, is not applicable and left out. Returns
+    {template name: whether it was applied}.
+    """
+    applied = {}
+    with transaction.atomic():
+        UserState.objects.select_for_update().get_or_create(user_id=user.pk)
+        for template in templates:
+            applied[template.name] = not template.is_applied(user)
+            if not applied[template.name]:
+                continue
+            try:
+                # drops the rows inserted before the missing lookup
+                with transaction.atomic():
+                    materialize(user, template.rows)
+            except ObjectDoesNotExist:
+                applied[template.name] = False
+    return applied
@@ -1,19 +1,123 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
-from .models import Need, Goal, Step, Iteration, Delivery
+from rest_framework.authtoken.models import Token
+from .models import Need, Goal, Step, Iteration, Delivery, UserState
+from .tokens import issue_tokens
+
+
+def percentage(completed, total):
+    if(total == 0):
+        return "0%"
+    return str(completed / total * 100) + "%"
+
+
+class DynamicFieldsMixin:
+    """Sparse fieldsets (``fields``) and nested relations (``expand``).
+
+    ``project`` narrows a queryset to what the remaining fields read:
+    ``only()`` for the selected columns, ``select_related()`` for expanded
+    relations and the queryset methods listed in ``queryset_methods``.
+    """
+
+    # field name -> serializer class used when the relation is expanded
+    expandable_fields = {}
+    default_expand = ()
+    # non-model field name -> model columns it reads
+    field_sources = {}
+    # field name -> queryset method providing its annotations
+    queryset_methods = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields = fields
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        expand = self.default_expand if expand is None else expand
+        self.expanded = [name for name in expand
+                         if name in self.fields and name in self.expandable_fields]
+        for name in self.expanded:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+
+    def project(self, queryset):
+        for method in {self.queryset_methods[name] for name in self.fields
+                       if name in self.queryset_methods}:
+            queryset = getattr(queryset, method)()
+        related = [self.fields[name].source for name in self.expanded]
+        if related:
+            queryset = queryset.select_related(*related)
+        if self.requested_fields is None:
+            return queryset
+
+        opts = queryset.model._meta
+        columns = {opts.pk.name, *related}
+        for name, field in self.fields.items():
+            columns.update(self.field_sources.get(name, ()))
+            try:
+                if opts.get_field(field.source).concrete:
+                    columns.add(field.source)
+            except FieldDoesNotExist:
+                pass
+        return queryset.only(*columns)
+
+
+class ProgressSerializer(serializers.Serializer):
+    """Progress rollup read from ProgressQuerySet.with_progress annotations."""
 
+    percentageCompleted = serializers.SerializerMethodField('get_percentage_completed')
+    openDeliveries = serializers.SerializerMethodField('get_open_deliveries')
+    stepCount = serializers.SerializerMethodField('get_step_count')
+
+    queryset_methods = {'percentageCompleted': 'with_progress',
+                        'openDeliveries': 'with_progress',
+                        'stepCount': 'with_progress'}
+
+    def get_progress(self, obj):
+        if not hasattr(obj, 'step_count') and obj.pk is not None:
+            # single unannotated instance, one aggregate query
+            progress = type(obj).objects.with_progress().filter(pk=obj.pk).values(
+                'step_count', 'deliveries_total', 'deliveries_completed').first()
+            for name, value in (progress or {}).items():
+                setattr(obj, name, value)
+        return (getattr(obj, 'step_count', 0), getattr(obj, 'deliveries_total', 0),
+                getattr(obj, 'deliveries_completed', 0))
+
+    def get_percentage_completed(self, obj):
+        step_count, total, completed = self.get_progress(obj)
+        return percentage(completed, total)
+
+    def get_open_deliveries(self, obj):
+        step_count, total, completed = self.get_progress(obj)
+        return total - completed
+
+    def get_step_count(self, obj):
+        step_count, total, completed = self.get_progress(obj)
+        return step_count
+
+
+class NeedSerializer(ProgressSerializer, DynamicFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Need
+        fields = ['id', 'name', 'description', 'iconName', 'iconColor',
+                  'percentageCompleted', 'openDeliveries', 'stepCount']
 
-class NeedSerializer(serializers.ModelSerializer):
+
+class NeedNestedSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Need
-        fields = ['id', 'name', 'description', 'iconName', 'iconColor']
+        fields = '__all__'
+
 
+class GoalGetSerializer(ProgressSerializer, DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'need': NeedNestedSerializer}
+    default_expand = ('need',)
 
-class GoalGetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Goal
-        fields = ['id', 'name', 'description', 'endDate', 'need']
-        depth = 1
+        fields = ['id', 'name', 'description', 'endDate', 'need',
+                  'percentageCompleted', 'openDeliveries', 'stepCount']
 
 class GoalPostPutSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,32 +125,81 @@ class GoalPostPutSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'endDate', 'need']
 
 
-class StepSerializer(serializers.ModelSerializer):
+class StepSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 
     percentageCompleted = serializers.SerializerMethodField('get_percentage_completed')
+    expandable_fields = {'goal': GoalPostPutSerializer}
+    field_sources = {'percentageCompleted': ('deliveries_total', 'deliveries_completed')}
+
     class Meta:
         model = Step
         fields = ['id', 'name', 'description', 'completed', 'goal','percentageCompleted']
 
     def get_percentage_completed(self, obj):
-        count = Delivery.objects.filter(step = obj.id)
-        count_completed = count.filter(completed=True)
-        if(count.count() == 0):
-            return "0%"
-        percentage = count_completed.count() /count.count() * 100
-        return str(percentage)+ "%"
+        # counters are kept up to date by Delivery writes, see needs.models
+        return percentage(obj.deliveries_completed, obj.deliveries_total)
 
 
-class IterationSerializer(serializers.ModelSerializer):
+class IterationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Iteration
         fields = ['id', 'number', 'completed', 'date']
 
 
-class DeliverySerializer(serializers.ModelSerializer):
+class DeliverySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'step': StepSerializer, 'iteration': IterationSerializer}
 
     class Meta:
         model = Delivery
         fields = ['id', 'name', 'description',
                   'step', 'iteration', 'completed']
+
+
+class PrefetchedRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field resolved from ``context['related'][field_name]``.
+
+    The dict holds the objects the request may reference, fetched once for
+    a whole batch, so validating an item runs no query.
+    """
+
+    def to_internal_value(self, data):
+        # only plain integers, int() would take true for 1 and 2.5 for 2
+        if not isinstance(data, int) or isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.context['related'][self.field_name][data]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class DeliveryBulkUpdateSerializer(serializers.ModelSerializer):
+    step = PrefetchedRelatedField(queryset=Step.objects.all(), allow_null=True)
+    iteration = PrefetchedRelatedField(queryset=Iteration.objects.all(), allow_null=True)
+
+    class Meta:
+        model = Delivery
+        fields = ['name', 'description', 'step', 'iteration', 'completed']
+
+
+class IterationPlanSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.IntegerField(), default=list)
+    remove = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+    def validate(self, data):
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError('A delivery cannot be added and removed at once.')
+        return data
+
+
+class TokenSerializer(serializers.ModelSerializer):
+    """rest_auth login response: the token key plus signed access/refresh tokens."""
+
+    class Meta:
+        model = Token
+        fields = ['key']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(issue_tokens(instance.user, UserState.token_version_of(instance.user)))
+        return data
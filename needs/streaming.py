@@ -0,0 +1,28 @@
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+def stream_json_list(queryset, serializer, chunk_size=500):
+    """Render a queryset as a JSON array written out chunk by chunk.
+
+    Rows are read with ``queryset.iterator`` so only one chunk of model
+    instances and its rendered JSON are held in memory at a time, and the
+    opening bracket is sent before the first query is even executed.
+    """
+    renderer = JSONRenderer()
+
+    def render():
+        yield b'['
+        separator = b''
+        chunk = []
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(renderer.render(serializer.to_representation(instance)))
+            if len(chunk) == chunk_size:
+                yield separator + b','.join(chunk)
+                separator = b','
+                chunk = []
+        if chunk:
+            yield separator + b','.join(chunk)
+        yield b']'
+
+    return StreamingHttpResponse(render(), content_type='application/json')
@@ -0,0 +1,6 @@
+from django.test import override_settings
+
+# Users created in setUp hash their password with the first hasher;
+# MD5 keeps that cheap, tests do not need a strong hash.
+fast_hashing = override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+from django.http import HttpResponse
+from django.test import TransactionTestCase, override_settings, AsyncClient
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from needs.models import Need, Goal, Step, Delivery
+from needs.async_views import ASGIHandler, async_view
+from needs import views
+from needs.caching import response_cache
+from needs.tests import fast_hashing
+
+
+@fast_hashing
+@override_settings(ROOT_URLCONF='igin.asgi_urls')
+class AsyncReadViewTest(TransactionTestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user(
+            'root1', 'email1@exemple.com', 'root')
+        self.need1 = Need.objects.create(
+            name='need1', description='need1 description', user=self.user1)
+        self.token = Token.objects.create(user=self.user1)
+
+    def auth(self):
+        # AsyncClient turns extra keyword arguments into request headers
+        return {'authorization': 'Token ' + self.token.key}
+
+    def test_read_views_are_async(self):
+        self.assertTrue(asyncio.iscoroutinefunction(async_view(views.need_list_view)))
+
+    async def test_need_list(self):
+        response = await AsyncClient().get('/need/', **self.auth())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'need1')
+
+    async def test_streamed_delivery_list(self):
+        response = await AsyncClient().get('/delivery/', {'stream': '1'}, **self.auth())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    async def test_unauthenticated(self):
+        response = await AsyncClient().get('/need/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_writes_do_not_use_the_pool(self):
+        threads = {}
+
+        def view(request):
+            threads[request.method] = threading.current_thread().name
+            return HttpResponse()
+
+        for method in ('GET', 'POST'):
+            await async_view(view)(SimpleNamespace(method=method))
+        self.assertTrue(threads['GET'].startswith('needs-views'))
+        self.assertFalse(threads['POST'].startswith('needs-views'))
+
+    def stream_deliveries(self, send):
+        goal = Goal.objects.create(name='goal1', need=self.need1)
+        step = Step.objects.create(name='step1', goal=goal)
+        Delivery.objects.bulk_create([Delivery(name='d%d' % i, description='d', step=step)
+                                      for i in range(1200)])
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/delivery/', 'query_string': b'stream=1',
+            'headers': [(b'host', b'testserver'),
+                        (b'authorization', ('Token ' + self.token.key).encode())],
+            'server': ('testserver', 80),
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        asyncio.run(ASGIHandler()(scope, receive, send))
+
+    def test_streamed_list_is_sent_in_chunks(self):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        self.stream_deliveries(send)
+
+        self.assertEqual(messages[0]['status'], 200)
+        bodies = [message['body'] for message in messages[1:] if message.get('body')]
+        # '[', the 500 row chunks and ']', never the whole list at once
+        self.assertEqual(len(bodies), 5)
+        self.assertEqual(len(json.loads(b''.join(bodies))), 1200)
+        self.assertFalse(messages[-1].get('more_body'))
+
+    def test_streamed_list_client_gone(self):
+        messages = []
+
+        async def send(message):
+            if len(messages) == 2:
+                raise OSError('client gone')
+            messages.append(message)
+
+        # the pool thread producing the body is released, nothing hangs
+        with self.assertRaises(OSError):
+            self.stream_deliveries(send)
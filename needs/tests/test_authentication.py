@@ -0,0 +1,294 @@
+import base64
+import datetime
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from needs import authentication
+from needs.tokens import issue_tokens
+from needs.models import Need, SpentRefreshToken, UserState
+from needs.authentication import (CachedTokenAuthentication, LocalTokenCache,
+                                  SharedTokenCache)
+from needs.caching import response_cache
+from needs.tests import fast_hashing
+
+
+class LocalTokenCacheTest(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LocalTokenCache(max_size=2, timeout=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expires_entries(self):
+        cache = LocalTokenCache(max_size=2, timeout=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+@fast_hashing
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        authentication.token_cache.clear()
+        self.user = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def tearDown(self):
+        authentication.token_cache.clear()
+
+    def test_token_lookup_is_cached(self):
+        auth = CachedTokenAuthentication()
+        with self.assertNumQueries(1):
+            user, token = auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            cached_user, cached_token = auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(cached_user, self.user)
+        self.assertEqual(cached_token.key, self.token.key)
+
+    def test_logout_invalidates_token(self):
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/rest-auth/logout/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivation_invalidates_token(self):
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(CACHES={'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_shared_cache(self):
+        shared = SharedTokenCache('tokens', 60)
+        local = authentication.token_cache
+        authentication.token_cache = shared
+        try:
+            auth = CachedTokenAuthentication()
+            auth.authenticate_credentials(self.token.key)
+            with self.assertNumQueries(0):
+                user, token = auth.authenticate_credentials(self.token.key)
+            self.assertEqual(user, self.user)
+
+            key = self.token.key
+            self.token.delete()
+            self.assertIsNone(shared.get(authentication.cache_key(key)))
+        finally:
+            shared.clear()
+            authentication.token_cache = local
+
+
+    @override_settings(TOKEN_CACHE_ALIAS=None, TOKEN_CACHE_LOCAL_TIMEOUT=5)
+    def test_local_cache_is_short_lived(self):
+        # other workers keep a logged out token for this long at most
+        cache = authentication.build_token_cache()
+        self.assertIsInstance(cache, LocalTokenCache)
+        self.assertEqual(cache.timeout, 5)
+
+    @override_settings(TOKEN_CACHE_ALIAS='tokens', TOKEN_CACHE_TIMEOUT=300)
+    def test_shared_cache_timeout(self):
+        cache = authentication.build_token_cache()
+        self.assertIsInstance(cache, SharedTokenCache)
+        self.assertEqual(cache.timeout, 300)
+
+
+@fast_hashing
+class SignedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.need = Need.objects.create(name='need1', description='need1', user=self.user)
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/rest-auth/login/',
+                                    {'username': 'root1', 'password': 'root'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_login_issues_signed_tokens(self):
+        data = self.login()
+        self.assertIn('key', data)
+        self.assertIn('access', data)
+        self.assertIn('refresh', data)
+
+    def test_access_token_needs_no_auth_query(self):
+        access = self.login()['access']
+        self.client.logout()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], 'need1')
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'auth_user' in query['sql'] or 'authtoken' in query['sql']])
+
+    def test_invalid_access_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer nonsense')
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_token_is_not_an_access_token(self):
+        refresh = self.login()['refresh']
+        self.client.logout()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + refresh)
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_rotates_tokens(self):
+        refresh = self.login()['refresh']
+        response = self.client.post(reverse('needs:token_refresh'),
+                                    {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertIn('refresh', response.data)
+
+    def test_refresh_token_works_once(self):
+        refresh = self.login()['refresh']
+        response = self.client.post(reverse('needs:token_refresh'),
+                                    {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        rotated = response.data['refresh']
+
+        response = self.client.post(reverse('needs:token_refresh'),
+                                    {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+        # the new one still works, once
+        response = self.client.post(reverse('needs:token_refresh'),
+                                    {'refresh': rotated}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_tokens_of_other_sessions_stay_valid(self):
+        first = self.login()['refresh']
+        second = self.login()['refresh']
+        for refresh in (first, second):
+            response = self.client.post(reverse('needs:token_refresh'),
+                                        {'refresh': refresh}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(REFRESH_TOKEN_LIFETIME=60)
+    def test_expired_spent_tokens_are_dropped(self):
+        SpentRefreshToken.objects.create(
+            jti='old', spent_at=timezone.now() - datetime.timedelta(seconds=61))
+        refresh = self.login()['refresh']
+        self.client.post(reverse('needs:token_refresh'), {'refresh': refresh}, format='json')
+        self.assertFalse(SpentRefreshToken.objects.filter(jti='old').exists())
+        self.assertEqual(SpentRefreshToken.objects.count(), 1)
+
+    def test_revoked_refresh_token(self):
+        refresh = self.login()['refresh']
+        UserState.revoke_tokens(self.user.pk)
+        response = self.client.post(reverse('needs:token_refresh'),
+                                    {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_refresh_token(self):
+        data = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + data['key'])
+        self.client.post('/rest-auth/logout/')
+        response = self.client.post(reverse('needs:token_refresh'),
+                                    {'refresh': data['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def bearer(self):
+        access = self.login()['access']
+        self.client.logout()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+
+    def test_user_details_with_access_token(self):
+        self.bearer()
+        response = self.client.get('/rest-auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'root1')
+        self.assertEqual(response.data['email'], 'email1@exemple.com')
+
+    def test_user_update_with_access_token(self):
+        self.bearer()
+        response = self.client.patch('/rest-auth/user/', {'first_name': 'Al'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'root1')
+
+        # only the patched field changed, the rest of the row is kept
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'Al')
+        self.assertEqual(user.username, 'root1')
+        self.assertEqual(user.email, 'email1@exemple.com')
+        self.assertIsNotNone(user.last_login)
+        self.assertTrue(user.check_password('root'))
+
+    def test_create_with_access_token(self):
+        self.bearer()
+        response = self.client.post(reverse('needs:need_list'),
+                                    {'name': 'need2', 'description': 'need2'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Need.objects.get(pk=response.data['id']).user, self.user)
+
+    def test_admin_with_access_token(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.bearer()
+        response = self.client.get(reverse('needs:cache_stats'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_access_token_of_deleted_user(self):
+        access = issue_tokens(User(pk=self.user.pk + 1), 0)['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+        response = self.client.get('/rest-auth/user/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(ACCESS_TOKEN_LIFETIME=-1)
+    def test_expired_access_token(self):
+        access = self.login()['access']
+        self.client.logout()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 401)
+
+
+class PasswordAuthenticationTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+
+    def test_basic_auth_is_rejected_by_api_views(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Basic ' +
+                           base64.b64encode(b'root1:root').decode())
+        response = client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_login_still_checks_password(self):
+        client = APIClient()
+        response = client.post('/rest-auth/login/',
+                               {'username': 'root1', 'password': 'wrong'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/rest-auth/login/',
+                               {'username': 'root1', 'password': 'root'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_passwords_are_hashed_with_pbkdf2(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
@@ -0,0 +1,289 @@
+import json
+import shutil
+import tempfile
+from datetime import date
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from asgiref.testing import ApplicationCommunicator
+from needs import events
+from needs.async_views import EventStreamMiddleware
+from needs.events import CacheBroker, LocalBroker, Subscription, event
+from needs.models import Need, Goal, Step, Iteration, Delivery, UserState
+from needs.caching import response_cache
+from needs.tests import fast_hashing
+
+
+def decoded(events_):
+    return [(item['type'], json.loads(item['data'])) for item in events_]
+
+
+class LocalBrokerTest(TestCase):
+
+    def test_publish_reaches_the_users_subscriptions(self):
+        broker = LocalBroker()
+        mine, other = Subscription(), Subscription()
+        broker.subscribe(1, mine)
+        broker.subscribe(2, other)
+        broker.publish(1, [event('deleted', collection='need', id=3)])
+        self.assertEqual(decoded(mine.get(0)), [('deleted', {'collection': 'need', 'id': 3})])
+        self.assertEqual(other.get(0), [])
+
+    def test_unsubscribe(self):
+        broker = LocalBroker()
+        subscription = Subscription()
+        broker.subscribe(1, subscription)
+        broker.unsubscribe(1, subscription)
+        broker.publish(1, [event('changed', collections=['need'])])
+        self.assertEqual(subscription.get(0), [])
+        self.assertEqual(broker.subscriptions, {})
+
+    def test_overflow_resets(self):
+        broker = LocalBroker()
+        subscription = Subscription(max_queued=2)
+        broker.subscribe(1, subscription)
+        broker.publish(1, [event('changed', collections=['need'])] * 3)
+        self.assertEqual(subscription.get(0), [events.RESET])
+
+    def test_resume_resets(self):
+        broker = LocalBroker()
+        subscription = Subscription()
+        broker.subscribe(1, subscription, last_id='5')
+        self.assertEqual(subscription.get(0), [events.RESET])
+
+
+class CacheBrokerTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # the poller thread sleeps through the test, polls are run by hand
+        self.broker = CacheBroker(poll_interval=3600)
+
+    def test_delivers_events_of_other_processes(self):
+        subscription = Subscription()
+        self.broker.subscribe(1, subscription)
+        CacheBroker().publish(1, [event('changed', collections=['need'])])
+        CacheBroker().publish(2, [event('changed', collections=['goal'])])
+        self.broker.poll_once()
+        self.assertEqual([(item['id'], item['type']) for item in subscription.get(0)],
+                         [(1, 'changed')])
+        self.broker.poll_once()
+        self.assertEqual(subscription.get(0), [])
+
+    def test_replays_from_last_event_id(self):
+        publisher = CacheBroker()
+        publisher.publish(1, [event('changed', collections=['need'])] * 3)
+        subscription = Subscription()
+        self.broker.subscribe(1, subscription, last_id='1')
+        self.assertEqual([item['id'] for item in subscription.get(0)], [2, 3])
+
+    def test_resets_when_events_expired(self):
+        CacheBroker(retention=-1).publish(1, [event('changed', collections=['need'])] * 3)
+        subscription = Subscription()
+        self.broker.subscribe(1, subscription, last_id='1')
+        self.assertEqual(subscription.get(0), [events.RESET])
+
+    def test_resets_when_an_event_stays_missing(self):
+        subscription = Subscription()
+        self.broker.subscribe(1, subscription)
+        # a publisher that numbered its event but did not store it
+        cache.set(self.broker.counter_key(1), 1)
+        self.broker.poll_once()
+        self.assertEqual(subscription.get(0), [])
+        self.broker.poll_once()
+        self.assertEqual(subscription.get(0), [events.RESET])
+
+
+@fast_hashing
+class PublishesTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.need1 = Need.objects.create(name='need1', description='d', user=self.user1)
+        self.goal1 = Goal.objects.create(name='goal1', description='d', need=self.need1)
+        self.step1 = Step.objects.create(name='step1', description='d', goal=self.goal1)
+        self.delivery1 = Delivery.objects.create(name='delivery1', description='d',
+                                                 step=self.step1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+        self.subscription = Subscription()
+        events.broker.subscribe(self.user1.pk, self.subscription)
+        self.addCleanup(events.broker.unsubscribe, self.user1.pk, self.subscription)
+
+    def published(self):
+        return decoded(self.subscription.get(0))
+
+    def test_created(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/need/', {'name': 'need2', 'description': 'd'},
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.published(), [
+            ('created', {'collection': 'need', 'object': response.json()})])
+
+    def test_updated_with_changed_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/delivery/%d/' % self.delivery1.pk, {
+                'name': 'delivery1', 'description': 'd', 'step': self.step1.pk,
+                'completed': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.published(), [
+            ('updated', {'collection': 'delivery', 'object': response.json()}),
+            ('changed', {'collections': ['step']})])
+
+    def test_deleted_with_cascades(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/need/%d/' % self.need1.pk)
+        self.assertEqual(self.published(), [
+            ('deleted', {'collection': 'need', 'id': self.need1.pk}),
+            ('changed', {'collections': ['goal', 'step', 'delivery']})])
+
+    def test_bulk_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/delivery/bulk/', [
+                {'id': self.delivery1.pk, 'completed': True}], format='json')
+        published = self.published()
+        self.assertEqual([(kind, data.get('collection')) for kind, data in published],
+                         [('updated', 'delivery'), ('changed', None)])
+        self.assertTrue(published[0][1]['object']['completed'])
+
+    def test_moves_publish_changed(self):
+        iteration = Iteration.objects.create(number=0, completed=False, date=date.today(),
+                                             owner=self.user1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/iteration/%d/plan/' % iteration.pk,
+                                        {'add': [self.delivery1.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.published(), [('changed', {'collections': ['delivery']})])
+
+    def test_failed_writes_publish_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/need/', {'name': ''}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.published(), [])
+
+
+@fast_hashing
+@override_settings(EVENTS_STREAM_TIMEOUT=5, EVENTS_HEARTBEAT=0.01)
+class EventStreamViewTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+
+    def test_streams_events(self):
+        response = self.client.get('/events/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), b'retry: 3000\n\n')
+        events.broker.publish(self.user1.pk, [event('deleted', collection='need', id=1)])
+        frame = next(stream)
+        self.assertRegex(frame, rb'^id: \d+\nevent: deleted\ndata: \{.*\}\n\n$')
+        self.assertEqual(next(stream), b': keep-alive\n\n')
+        response.close()
+        self.assertNotIn(self.user1.pk, events.broker.subscriptions)
+
+    def test_unauthenticated(self):
+        response = APIClient().get('/events/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 401)
+
+
+class RefetchingBroker(LocalBroker):
+    """Records what a client refetching on each event is answered."""
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+        self.seen = []
+
+    def publish(self, user_id, events_):
+        names = [need['name'] for need in self.client.get('/need/').json()]
+        self.seen.append((UserState.data_version_of(user_id), names))
+        super().publish(user_id, events_)
+
+
+@fast_hashing
+class PublishOrderTest(TransactionTestCase):
+    """Outside of a transaction events are sent as soon as the view returns."""
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+        broker = events.broker
+        events.broker = RefetchingBroker(self.client)
+        self.addCleanup(setattr, events, 'broker', broker)
+
+    def assertRefetchSeesWrite(self):
+        self.assertEqual(self.client.get('/need/').json(), [])
+        response = self.client.post('/need/', {'name': 'need1', 'description': 'd'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(events.broker.seen, [(1, ['need1'])])
+
+    def test_version_is_bumped_before_publishing(self):
+        self.assertRefetchSeesWrite()
+
+    def test_shared_cache_is_invalidated_before_publishing(self):
+        shared = dict(settings.CACHES, responses={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.mkdtemp()})
+        self.addCleanup(shutil.rmtree, shared['responses']['LOCATION'])
+        with self.settings(CACHES=shared):
+            self.assertRefetchSeesWrite()
+
+
+@fast_hashing
+@override_settings(EVENTS_HEARTBEAT=0.05)
+class EventStreamMiddlewareTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.token = Token.objects.create(user=self.user1)
+
+    async def fallback(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    def scope(self, path, token=None):
+        headers = [(b'accept', b'text/event-stream')]
+        if token:
+            headers.append((b'authorization', ('Token ' + token).encode()))
+        return {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+                'headers': headers, 'root_path': '', 'server': ('testserver', 80)}
+
+    async def test_streams_events(self):
+        app = ApplicationCommunicator(EventStreamMiddleware(self.fallback),
+                                      self.scope('/events/', self.token.key))
+        await app.send_input({'type': 'http.request', 'body': b''})
+        start = await app.receive_output(5)
+        self.assertEqual(start['status'], 200)
+        self.assertEqual((await app.receive_output(5))['body'], b'retry: 3000\n\n')
+
+        events.broker.publish(self.user1.pk, [event('deleted', collection='need', id=1)])
+        body = b''
+        while b'event: deleted' not in body:
+            body = (await app.receive_output(5))['body']
+        await app.send_input({'type': 'http.disconnect'})
+        await app.wait(5)
+        self.assertNotIn(self.user1.pk, events.broker.subscriptions)
+
+    async def test_unauthenticated(self):
+        app = ApplicationCommunicator(EventStreamMiddleware(self.fallback),
+                                      self.scope('/events/'))
+        await app.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await app.receive_output(5))['status'], 401)
+
+    async def test_other_paths_pass_through(self):
+        app = ApplicationCommunicator(EventStreamMiddleware(self.fallback),
+                                      self.scope('/need/', self.token.key))
+        await app.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await app.receive_output(5))['status'], 204)
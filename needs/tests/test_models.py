@@ -1,11 +1,18 @@
 from django.test import TestCase
 from needs.models import Need, Goal, Step, Iteration, Delivery
 from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
 import datetime
+import io
+from django.core.management import call_command
+from django.db import IntegrityError
+from needs.management.commands.rollover_iterations import shards
+from needs.tests import fast_hashing
 
 # Create your tests here.
 
 
+@fast_hashing
 class NeedBasicModelTests(TestCase):
 
     def setUp(self):
@@ -70,6 +77,7 @@ class NeedBasicModelTests(TestCase):
         self.assertEqual(count, 2)
 
 
+@fast_hashing
 class StepModelTest(TestCase):
 
     def setUp(self):
@@ -120,6 +128,7 @@ class StepModelTest(TestCase):
         self.assertEqual(count, 2)
 
 
+@fast_hashing
 class GoalModelTest(TestCase):
 
     def setUp(self):
@@ -180,6 +189,7 @@ class GoalModelTest(TestCase):
         self.assertEqual(Goal.objects.all().count(), 2)
 
 
+@fast_hashing
 class IterationModelTest(TestCase):
 
     def setUp(self):
@@ -205,17 +215,23 @@ class IterationModelTest(TestCase):
     def test_Iteration_creation(self):
         count = Iteration.objects.all().count()
         self.assertEqual(count, 1)
-        Iteration.objects.create(number=2, completed=False,
+        Iteration.objects.create(number=2, completed=True,
                                  date=datetime.date.today(), owner=self.user1)
         count = Iteration.objects.all().count()
         self.assertEqual(count, 2)
 
+    def test_only_one_active_iteration_per_owner(self):
+        with self.assertRaises(IntegrityError):
+            Iteration.objects.create(number=2, completed=False,
+                                     date=datetime.date.today(), owner=self.user1)
+
     def test_iteration_date(self):
         iteration = Iteration.objects.get(id=self.iteration1.id)
         today = datetime.date.today()
         self.assertEqual(iteration.date, today)
 
 
+@fast_hashing
 class DelivelyModelTest(TestCase):
 
     def setUp(self):
@@ -269,6 +285,7 @@ class DelivelyModelTest(TestCase):
         self.assertEqual(count, 4)
 
 
+@fast_hashing
 class IconTest(TestCase):
 
     def setUp(self):
@@ -310,3 +327,223 @@ class IconTest(TestCase):
 
         self.assertEquals(self.need1.iconName, "far fa-heart")
         self.assertEquals(self.need1.icon_color, "bg-red-500")
+
+
+@fast_hashing
+class StepDeliveryCountersTest(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            'root1', 'email2@exemple.com', 'root')
+        self.need1 = Need.objects.create(
+            name='mind', description='a need we have', user=self.user1)
+        self.goal1 = Goal.objects.create(name="teste", need=self.need1)
+        self.iteration1 = Iteration.objects.create(number=1, completed=False,
+                                                   date=datetime.date.today(), owner=self.user1)
+        self.step1 = Step.objects.create(name='first step', goal=self.goal1)
+        self.step2 = Step.objects.create(name='second step', goal=self.goal1)
+
+    def assertCounters(self, step, total, completed):
+        step.refresh_from_db()
+        self.assertEqual(step.deliveries_total, total)
+        self.assertEqual(step.deliveries_completed, completed)
+
+    def test_counters_on_create(self):
+        Delivery.objects.create(name='d1', description='d', step=self.step1)
+        Delivery.objects.create(name='d2', description='d', step=self.step1, completed=True)
+        self.assertCounters(self.step1, 2, 1)
+        self.assertCounters(self.step2, 0, 0)
+
+    def test_counters_on_completed_flip(self):
+        delivery = Delivery.objects.create(name='d1', description='d', step=self.step1)
+        delivery = Delivery.objects.get(pk=delivery.pk)
+        delivery.completed = True
+        delivery.save()
+        self.assertCounters(self.step1, 1, 1)
+        delivery.completed = False
+        delivery.save()
+        self.assertCounters(self.step1, 1, 0)
+
+    def test_counters_on_step_reassignment(self):
+        delivery = Delivery.objects.create(name='d1', description='d', step=self.step1, completed=True)
+        delivery = Delivery.objects.get(pk=delivery.pk)
+        delivery.step = self.step2
+        delivery.save()
+        self.assertCounters(self.step1, 0, 0)
+        self.assertCounters(self.step2, 1, 1)
+
+    def test_counters_on_delete(self):
+        delivery = Delivery.objects.create(name='d1', description='d', step=self.step1, completed=True)
+        Delivery.objects.get(pk=delivery.pk).delete()
+        self.assertCounters(self.step1, 0, 0)
+
+    def test_counters_on_bulk_create(self):
+        Delivery.objects.bulk_create([
+            Delivery(name='d1', description='d', step=self.step1),
+            Delivery(name='d2', description='d', step=self.step1, completed=True),
+            Delivery(name='d3', description='d', step=self.step2),
+            Delivery(name='d4', description='d'),
+        ])
+        self.assertCounters(self.step1, 2, 1)
+        self.assertCounters(self.step2, 1, 0)
+
+    def test_counters_on_queryset_update_and_delete(self):
+        Delivery.objects.create(name='d1', description='d', step=self.step1)
+        Delivery.objects.create(name='d2', description='d', step=self.step1)
+        Delivery.objects.filter(step=self.step1).update(completed=True)
+        self.assertCounters(self.step1, 2, 2)
+        Delivery.objects.filter(step=self.step1).update(step=self.step2)
+        self.assertCounters(self.step1, 0, 0)
+        self.assertCounters(self.step2, 2, 2)
+        Delivery.objects.filter(step=self.step2).delete()
+        self.assertCounters(self.step2, 0, 0)
+
+    def test_counters_on_iteration_delete(self):
+        Delivery.objects.create(name='d1', description='d', step=self.step1,
+                                iteration=self.iteration1)
+        Delivery.objects.create(name='d2', description='d', step=self.step1)
+        self.iteration1.delete()
+        self.assertCounters(self.step1, 1, 0)
+
+    def test_step_save_keeps_counters(self):
+        step = Step.objects.get(pk=self.step1.pk)
+        Delivery.objects.create(name='d1', description='d', step=self.step1)
+        step.name = 'renamed'
+        step.save()
+        self.assertCounters(self.step1, 1, 0)
+
+    def test_reconcile_command_repairs_drift(self):
+        Delivery.objects.create(name='d1', description='d', step=self.step1, completed=True)
+        Step.objects.filter(pk=self.step1.pk).update(deliveries_total=7, deliveries_completed=0)
+
+        out = io.StringIO()
+        call_command('reconcile_step_counters', '--check', stdout=out)
+        self.assertIn('found 1', out.getvalue())
+        self.assertCounters(self.step1, 7, 0)
+
+        call_command('reconcile_step_counters', '--chunk-size', '1', stdout=out)
+        self.assertCounters(self.step1, 1, 1)
+
+
+@fast_hashing
+class RolloverIterationsCommandTest(TestCase):
+
+    def setUp(self):
+        today = datetime.date.today()
+        self.users = [User.objects.create_user('root%d' % i, 'e%d@exemple.com' % i, 'root')
+                      for i in range(5)]
+        self.iterations = [
+            Iteration.objects.create(number=i, completed=False, owner=user,
+                                     date=today - datetime.timedelta(days=1 if i < 4 else -1))
+            for i, user in enumerate(self.users)]
+        need = Need.objects.create(name='mind', user=self.users[0])
+        self.step = Step.objects.create(name='step', goal=Goal.objects.create(name='g', need=need))
+        self.open = Delivery.objects.create(name='open', description='', step=self.step,
+                                            iteration=self.iterations[0])
+        self.done = Delivery.objects.create(name='done', description='', step=self.step,
+                                            iteration=self.iterations[0], completed=True)
+
+    def test_rolls_over_due_iterations(self):
+        out = io.StringIO()
+        call_command('rollover_iterations', '--chunk-size', '3', stdout=out)
+        self.assertIn('Rolled over 4 iterations', out.getvalue())
+
+        for i, user in enumerate(self.users):
+            active = Iteration.objects.get(owner=user, completed=False)
+            if i < 4:
+                self.assertEqual(active.number, i + 1)
+            else:
+                self.assertEqual(active, self.iterations[4])
+        self.open.refresh_from_db()
+        self.done.refresh_from_db()
+        self.assertEqual(self.open.iteration, Iteration.objects.get(owner=self.users[0],
+                                                                    completed=False))
+        self.assertEqual(self.done.iteration, self.iterations[0])
+
+    def test_nothing_due(self):
+        out = io.StringIO()
+        call_command('rollover_iterations', '--date', '2000-01-01', stdout=out)
+        self.assertIn('Rolled over 0 iterations', out.getvalue())
+
+    def test_shards_cover_owner_range(self):
+        self.assertEqual(shards(1, 10, 3), [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(shards(5, 5, 4), [(5, 5)])
+
+
+@fast_hashing
+class OwnerColumnTest(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            'root1', 'email2@exemple.com', 'root')
+        self.need1 = Need.objects.create(
+            name='mind', description='a need we have', user=self.user1)
+        self.iteration1 = Iteration.objects.create(number=1, completed=False,
+                                                   date=datetime.date.today(), owner=self.user1)
+
+    def test_owner_follows_parents(self):
+        goal = Goal.objects.create(name="teste", need=self.need1)
+        step = Step.objects.create(name='first step', goal=goal)
+        delivery = Delivery.objects.create(name='d1', description='d', step=step)
+        self.assertEqual(goal.owner, self.user1)
+        self.assertEqual(step.owner, self.user1)
+        self.assertEqual(delivery.owner, self.user1)
+
+    def test_delivery_without_step_takes_iteration_owner(self):
+        delivery = Delivery.objects.create(name='d1', description='d', iteration=self.iteration1)
+        self.assertEqual(delivery.owner, self.user1)
+
+    def test_owner_on_bulk_create(self):
+        goal = Goal.objects.create(name="teste", need=self.need1)
+        Step.objects.bulk_create([Step(name='s1', goal=goal), Step(name='s2', goal=goal)])
+        step = Step.objects.filter(goal=goal).first()
+        Delivery.objects.bulk_create([Delivery(name='d1', description='d', step=step),
+                                      Delivery(name='d2', description='d', iteration=self.iteration1)])
+        self.assertEqual(Step.objects.filter(owner=self.user1).count(), 2)
+        self.assertEqual(Delivery.objects.filter(owner=self.user1).count(), 2)
+
+
+@fast_hashing
+class GenerateDatasetCommandTest(TestCase):
+
+    def generate(self, *args):
+        call_command('generate_dataset', '--users', '2', '--needs', '2', '--goals', '2',
+                     '--steps', '2', '--deliveries', '3', '--iterations', '3',
+                     '--batch-size', '7', *args, stdout=io.StringIO())
+
+    def test_generates_owned_rows(self):
+        existing = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.generate()
+        users = User.objects.filter(username__startswith='load-')
+        self.assertEqual(users.count(), 2)
+        for user in users:
+            self.assertEqual(user.username, 'load-%d' % user.pk)
+            self.assertTrue(user.check_password('load'))
+            self.assertTrue(Token.objects.filter(user=user).exists())
+            self.assertEqual(Need.objects.filter(user=user).count(), 2)
+            self.assertEqual(Goal.objects.filter(owner=user, need__user=user).count(), 4)
+            self.assertEqual(Step.objects.filter(owner=user, goal__owner=user).count(), 8)
+            self.assertEqual(Delivery.objects.filter(owner=user, step__owner=user).count(), 24)
+            self.assertEqual(Iteration.objects.filter(owner=user).count(), 3)
+            self.assertEqual(Iteration.objects.filter(owner=user, completed=False).count(), 1)
+        self.assertFalse(Need.objects.filter(user=existing).exists())
+
+    def test_staff_users(self):
+        self.generate('--staff', '1')
+        users = User.objects.filter(username__startswith='load-').order_by('pk')
+        self.assertEqual([user.is_staff for user in users], [True, False])
+
+    def test_step_counters_match_deliveries(self):
+        self.generate()
+        out = io.StringIO()
+        call_command('reconcile_step_counters', '--check', stdout=out)
+        self.assertIn('found 0 with drifted counters', out.getvalue())
+        self.assertTrue(Step.objects.filter(deliveries_completed__gt=0).exists())
+
+    def test_runs_again_after_existing_rows(self):
+        self.generate()
+        self.generate('--prefix', 'more')
+        self.assertEqual(User.objects.filter(username__startswith='more-').count(), 2)
+        self.assertEqual(Delivery.objects.count(), 96)
+        # the sequences continue after the explicit primary keys
+        Need.objects.create(name='need', user=User.objects.first())
@@ -0,0 +1,164 @@
+import io
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from needs import urls
+from needs.caching import response_cache
+from needs.models import Need, Step, Iteration, Delivery, UserState
+from needs.tokens import issue_tokens
+
+# rows per parent of the two datasets, see manage.py generate_dataset
+SMALL = {'needs': 1, 'goals': 1, 'steps': 2, 'deliveries': 2, 'iterations': 2}
+LARGE = {'needs': 3, 'goals': 3, 'steps': 3, 'deliveries': 4, 'iterations': 4}
+
+# (route name, method, query string, url kwargs, body, budget): the query
+# budget of a request, which must also be the same for both datasets.
+# url kwargs and bodies are built from the ids of the user's rows.
+ENDPOINTS = [
+    ('need_list', 'GET', '', None, None, 2),
+    ('need_list', 'POST', '', None, lambda ids: {'name': 'n', 'description': 'd'}, 3),
+    ('need_detail', 'GET', '', lambda ids: {'pk': ids['need']}, None, 2),
+    ('need_detail', 'PUT', '', lambda ids: {'pk': ids['need']},
+     lambda ids: {'name': 'n', 'description': 'd'}, 4),
+    ('need_detail', 'DELETE', '', lambda ids: {'pk': ids['need']}, None, 8),
+
+    ('goal_list', 'GET', '', None, None, 2),
+    ('goal_list', 'GET', 'expand=need', None, None, 2),
+    ('goal_list', 'POST', '', None,
+     lambda ids: {'name': 'g', 'description': 'd', 'need': ids['need']}, 3),
+    ('goal_list_by_need', 'GET', '', lambda ids: {'need': ids['need']}, None, 2),
+    ('goal_detail', 'GET', '', lambda ids: {'pk': ids['goal']}, None, 2),
+    ('goal_detail', 'PUT', '', lambda ids: {'pk': ids['goal']},
+     lambda ids: {'name': 'g', 'description': 'd', 'need': ids['need']}, 4),
+    ('goal_detail', 'DELETE', '', lambda ids: {'pk': ids['goal']}, None, 6),
+
+    ('step_list', 'GET', '', None, None, 2),
+    ('step_list', 'GET', 'expand=goal', None, None, 2),
+    ('step_list', 'POST', '', None,
+     lambda ids: {'name': 's', 'description': 'd', 'goal': ids['goal']}, 3),
+    ('step_list_by_goal', 'GET', '', lambda ids: {'goal': ids['goal']}, None, 2),
+    ('step_detail', 'GET', '', lambda ids: {'pk': ids['step']}, None, 2),
+    ('step_detail', 'PUT', '', lambda ids: {'pk': ids['step']},
+     lambda ids: {'name': 's', 'description': 'd', 'goal': ids['goal']}, 4),
+    ('step_detail', 'DELETE', '', lambda ids: {'pk': ids['step']}, None, 4),
+
+    ('iteration_list', 'GET', '', None, None, 2),
+    ('iteration_list', 'POST', '', None,
+     lambda ids: {'number': 9, 'completed': True, 'date': '2021-01-01'}, 4),
+    ('iteration_detail', 'GET', '', lambda ids: {'pk': ids['iteration']}, None, 2),
+    ('iteration_detail', 'PUT', '', lambda ids: {'pk': ids['iteration']},
+     lambda ids: {'number': 9, 'completed': False, 'date': '2021-01-01'}, 5),
+    ('iteration_detail', 'DELETE', '', lambda ids: {'pk': ids['iteration']}, None, 8),
+    ('iteration_plan', 'POST', '', lambda ids: {'pk': ids['iteration']},
+     lambda ids: {'add': ids['deliveries'], 'remove': []}, 3),
+    ('active_iteration', 'GET', '', None, None, 2),
+    ('iteration_rollover', 'POST', '', None, None, 9),
+
+    ('delivery_list', 'GET', '', None, None, 2),
+    ('delivery_list', 'GET', 'expand=step,iteration', None, None, 2),
+    ('delivery_list', 'GET', 'stream=1', None, None, 2),
+    ('delivery_list', 'GET', 'page_size=2', None, None, 2),
+    ('delivery_list', 'POST', '', None,
+     lambda ids: {'name': 'd', 'description': 'd', 'step': ids['step']}, 6),
+    ('delivery_list_by_goal', 'GET', '', lambda ids: {'goal': ids['goal']}, None, 2),
+    ('delivery_list_by_step', 'GET', '', lambda ids: {'step': ids['step']}, None, 2),
+    ('delivery_list_by_iteration', 'GET', '', lambda ids: {'iteration': ids['iteration']},
+     None, 2),
+    ('delivery_detail', 'GET', '', lambda ids: {'pk': ids['delivery']}, None, 2),
+    ('delivery_detail', 'PUT', '', lambda ids: {'pk': ids['delivery']},
+     lambda ids: {'name': 'd', 'description': 'd', 'step': ids['step'], 'completed': True},
+     7),
+    ('delivery_detail', 'DELETE', '', lambda ids: {'pk': ids['delivery']}, None, 6),
+    ('delivery_bulk_update', 'PATCH', '', None,
+     lambda ids: [{'id': pk, 'completed': True, 'step': ids['step']}
+                  for pk in ids['deliveries']], 10),
+
+    ('bootstrap', 'GET', '', None, None, 6),
+    ('wizard', 'POST', '', None, None, 4),
+    ('tutorial_setup', 'POST', '', None, None, 17),
+    ('onboarding', 'POST', '', None, None, 18),
+    ('token_refresh', 'POST', '', None, lambda ids: {'refresh': ids['refresh']}, 5),
+    ('cache_stats', 'GET', '', None, None, 0),
+    ('event_stream', 'GET', '', None, None, 0),
+]
+
+# the dataset users are past the wizard, it answers 404 as it does for
+# every returning user
+EXPECTED_STATUS = {'wizard': 404}
+
+
+@override_settings(EVENTS_STREAM_TIMEOUT=0)
+class QueryBudgetTest(TestCase):
+    """Every endpoint stays within its budget, whatever the number of rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        for prefix, sizes in (('small', SMALL), ('large', LARGE)):
+            options = []
+            for name, value in sizes.items():
+                options += ['--%s' % name, str(value)]
+            # cache/stats/ is for staff
+            call_command('generate_dataset', '--users', '1', '--staff', '1', '--prefix', prefix,
+                         *options, stdout=io.StringIO())
+            user = User.objects.get(username__startswith=prefix + '-')
+            # the tutorial is seeded under "Others"
+            Need.objects.filter(pk=Need.objects.filter(user=user).latest('pk').pk).update(
+                name='Others')
+            cls.users[prefix] = user
+
+    def ids(self, user):
+        step = Step.objects.filter(owner=user).order_by('pk').first()
+        return {
+            'need': Need.objects.filter(user=user).order_by('pk').first().pk,
+            'goal': step.goal_id,
+            'step': step.pk,
+            'iteration': Iteration.objects.get(owner=user, completed=False).pk,
+            'delivery': Delivery.objects.filter(owner=user).order_by('pk').first().pk,
+            'deliveries': list(Delivery.objects.filter(step=step).values_list('pk', flat=True)),
+            'refresh': issue_tokens(user, UserState.token_version_of(user))['refresh'],
+        }
+
+    def queries(self, user, name, method, query, kwargs, body):
+        """The queries of a request, its changes rolled back."""
+        user.refresh_from_db()
+        ids = self.ids(user)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        path = reverse('needs:' + name, kwargs=kwargs(ids) if kwargs else None)
+        if query:
+            path += '?' + query
+        # the budget of a cache miss, entries of earlier requests would hide it
+        response_cache().clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method.lower())(
+                    path, body(ids) if body else None, format='json')
+                # streamed bodies run their queries while being sent
+                content = (b''.join(response.streaming_content) if response.streaming
+                           else response.content)
+            transaction.set_rollback(True)
+        self.assertEqual(response.status_code >= 400, name in EXPECTED_STATUS,
+                         '%s %s: %s %s' % (method, path, response.status_code, content))
+        if name in EXPECTED_STATUS:
+            self.assertEqual(response.status_code, EXPECTED_STATUS[name])
+        return queries.captured_queries
+
+    def test_budgets(self):
+        for name, method, query, kwargs, body, budget in ENDPOINTS:
+            with self.subTest(endpoint='%s %s %s' % (method, name, query)):
+                small = self.queries(self.users['small'], name, method, query, kwargs, body)
+                large = self.queries(self.users['large'], name, method, query, kwargs, body)
+                sql = '\n'.join('%d. %s' % (i, q['sql']) for i, q in enumerate(large, 1))
+                self.assertLessEqual(len(large), budget, 'over budget:\n' + sql)
+                self.assertEqual(len(small), len(large),
+                                 'grows with the number of rows:\n' + sql)
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {endpoint[0] for endpoint in ENDPOINTS}
+        routes = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(routes - budgeted, set())
@@ -6,6 +6,7 @@ import datetime
 import io
 from rest_framework.renderers import JSONRenderer
 from rest_framework.parsers import JSONParser
+from needs.tests import fast_hashing
 
 
 def get_json_data(serializerData):
@@ -15,6 +16,7 @@ def get_json_data(serializerData):
     return data
 
 
+@fast_hashing
 class NeedSerializerTest(TestCase):
 
     def setUp(self):
@@ -95,6 +97,7 @@ class NeedSerializerTest(TestCase):
         self.assertEqual(getNeed.iconColor, 'iconColor')
 
 
+@fast_hashing
 class GoalSerializerTest(TestCase):
 
     def setUp(self):
@@ -148,6 +151,7 @@ class GoalSerializerTest(TestCase):
         self.assertEqual(goal.endDate, nextWeekDate)
 
 
+@fast_hashing
 class StepSerializerTest(TestCase):
 
     def setUp(self):
@@ -213,6 +217,7 @@ class StepSerializerTest(TestCase):
         self.assertEqual(getStep.completed, True)
 
 
+@fast_hashing
 class IterationSerializerTest(TestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
@@ -235,7 +240,7 @@ class IterationSerializerTest(TestCase):
 
         self.iteration1 = Iteration.objects.create(number=1, completed=False,
                                                    date=datetime.date.today(), owner=self.user1)
-        self.iteration2 = Iteration.objects.create(number=2, completed=False,
+        self.iteration2 = Iteration.objects.create(number=2, completed=True,
                                                    date=datetime.date.today(), owner=self.user1)
         self.iteration3 = Iteration.objects.create(number=1, completed=True,
                                                    date=datetime.date.today(), owner=self.user1)
@@ -282,6 +287,7 @@ class IterationSerializerTest(TestCase):
         self.assertEqual(getIteration.owner, self.user1)
 
 
+@fast_hashing
 class DeliverySerializerTest(TestCase):
 
     def setUp(self):
@@ -305,7 +311,7 @@ class DeliverySerializerTest(TestCase):
 
         self.iteration1 = Iteration.objects.create(number=1, completed=False,
                                                    date=datetime.date.today(), owner=self.user1)
-        self.iteration2 = Iteration.objects.create(number=2, completed=False,
+        self.iteration2 = Iteration.objects.create(number=2, completed=True,
                                                    date=datetime.date.today(), owner=self.user1)
         self.iteration3 = Iteration.objects.create(number=1, completed=True,
                                                    date=datetime.date.today(), owner=self.user1)
@@ -1,17 +1,27 @@
-from django.test import TestCase
+from unittest import skipUnless
+from django.conf import settings
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
-from needs.models import Need, Goal, Step, Iteration, Delivery
+from needs.models import Need, Goal, Step, Iteration, Delivery, UserState
 from needs.serializers import NeedSerializer
+from needs.caching import response_cache
 from rest_framework.parsers import JSONParser
 import io
 import datetime
+import shutil
+import tempfile
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from needs.tests import fast_hashing
 
 
+@fast_hashing
 class NeedViewTest(TestCase):
 
     def setUp(self):
+        response_cache().clear()
         self.user1 = User.objects.create_user(
             'root1', 'email1@exemple.com', 'root')
         self.user2 = User.objects.create_user(
@@ -107,6 +117,32 @@ class NeedViewTest(TestCase):
 
         self.assertEqual(response.status_code, 401)
 
+    def test_need_list_with_progress(self):
+        goal1 = Goal.objects.create(name="goal1", need=self.need1)
+        goal2 = Goal.objects.create(name="goal2", need=self.need1)
+        step1 = Step.objects.create(name='step1', goal=goal1)
+        step2 = Step.objects.create(name='step2', goal=goal2)
+        Step.objects.create(name='step3', goal=goal2)
+        Delivery.objects.create(name='d1', description='d', step=step1, completed=True)
+        Delivery.objects.create(name='d2', description='d', step=step2)
+        Delivery.objects.create(name='d3', description='d', step=step2)
+        Delivery.objects.create(name='d4', description='d', step=step2, completed=True)
+
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        # the data version lookup of the ETag, then the list
+        with self.assertNumQueries(2):
+            response = client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 200)
+
+        stream = io.BytesIO(response.content)
+        data = {need['id']: need for need in JSONParser().parse(stream)}
+        self.assertEqual(data[self.need1.id]['percentageCompleted'], '50.0%')
+        self.assertEqual(data[self.need1.id]['openDeliveries'], 2)
+        self.assertEqual(data[self.need1.id]['stepCount'], 3)
+        self.assertEqual(data[self.need2.id]['percentageCompleted'], '0%')
+        self.assertEqual(data[self.need2.id]['stepCount'], 0)
+
     # ==============================================test_need_retrieve======================================
 
     def test_need_retrieve(self):
@@ -220,9 +256,11 @@ class NeedViewTest(TestCase):
         self.assertEqual(count, 3)
 
 
+@fast_hashing
 class GoalViewTest(TestCase):
 
     def setUp(self):
+        response_cache().clear()
         self.user1 = User.objects.create_user(
             'root1', 'email1@exemple.com', 'root')
         self.user2 = User.objects.create_user(
@@ -359,6 +397,66 @@ class GoalViewTest(TestCase):
         response = client.get(reverse('needs:goal_list'))
         self.assertEqual(response.status_code, 401)
 
+    def test_goal_list_with_progress(self):
+        step1 = Step.objects.create(name='step1', goal=self.goal1)
+        step2 = Step.objects.create(name='step2', goal=self.goal1)
+        Delivery.objects.create(name='d1', description='d', step=step1, completed=True)
+        Delivery.objects.create(name='d2', description='d', step=step1)
+        Delivery.objects.create(name='d3', description='d', step=step2)
+        Delivery.objects.create(name='d4', description='d', step=step2, completed=True)
+
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:goal_list'))
+        self.assertEqual(response.status_code, 200)
+
+        stream = io.BytesIO(response.content)
+        data = {goal['id']: goal for goal in JSONParser().parse(stream)}
+        self.assertEqual(data[self.goal1.id]['percentageCompleted'], '50.0%')
+        self.assertEqual(data[self.goal1.id]['openDeliveries'], 2)
+        self.assertEqual(data[self.goal1.id]['stepCount'], 2)
+        self.assertEqual(data[self.goal2.id]['percentageCompleted'], '0%')
+        self.assertEqual(data[self.goal2.id]['openDeliveries'], 0)
+        self.assertEqual(data[self.goal2.id]['stepCount'], 0)
+
+    def test_goal_list_nests_need_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        with self.assertNumQueries(2):
+            response = client.get(reverse('needs:goal_list'))
+        self.assertEqual(response.status_code, 200)
+
+        stream = io.BytesIO(response.content)
+        data = JSONParser().parse(stream)
+        self.assertEqual(data[0]['need']['name'], 'need1')
+        self.assertEqual(data[0]['need']['user'], self.user1.id)
+
+    def test_goal_list_sparse_fields(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('needs:goal_list'), {'fields': 'id,name'})
+        self.assertEqual(response.status_code, 200)
+
+        stream = io.BytesIO(response.content)
+        data = JSONParser().parse(stream)
+        self.assertEqual(data, [{'id': self.goal1.id, 'name': 'goal1'},
+                                {'id': self.goal2.id, 'name': 'goal2'}])
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('description', queries[-1]['sql'])
+        self.assertNotIn('"needs_step"', queries[-1]['sql'])
+
+    def test_goal_retrieve_sparse_fields(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:goal_detail', kwargs={'pk': self.goal1.id}),
+                              {'fields': 'id,need', 'expand': ''})
+        self.assertEqual(response.status_code, 200)
+
+        stream = io.BytesIO(response.content)
+        data = JSONParser().parse(stream)
+        self.assertEqual(data, {'id': self.goal1.id, 'need': self.need1.id})
+
     def test_goal_list_by_need(self):
         client = APIClient()
         client.force_authenticate(user=self.user1)
@@ -464,9 +562,11 @@ class GoalViewTest(TestCase):
         self.assertEqual(count, 3)
 
 
+@fast_hashing
 class StepViewTest(TestCase):
 
     def setUp(self):
+        response_cache().clear()
         self.user1 = User.objects.create_user(
             'root1', 'email1@exemple.com', 'root')
         self.user2 = User.objects.create_user(
@@ -544,6 +644,39 @@ class StepViewTest(TestCase):
         response = client.get(reverse('needs:step_list'))
         self.assertEqual(response.status_code, 401)
 
+    def test_step_list_with_percentage_completed(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        Delivery.objects.create(name="d1", description="", step=self.step1, completed=True)
+        Delivery.objects.create(name="d2", description="", step=self.step1)
+
+        response = client.get(reverse('needs:step_list'))
+        self.assertEqual(response.status_code, 200)
+
+        stream = io.BytesIO(response.content)
+        data = JSONParser().parse(stream)
+        percentages = {step['id']: step['percentageCompleted'] for step in data}
+        self.assertEqual(percentages[self.step1.id], '50.0%')
+        self.assertEqual(percentages[self.step2.id], '0%')
+
+    # measures the view, rows are added behind the cache's back
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_step_list_query_count_does_not_grow_with_steps(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        client.get(reverse('needs:step_list'))
+
+        with self.assertNumQueries(2):
+            client.get(reverse('needs:step_list'))
+
+        for i in range(5):
+            step = Step.objects.create(name='extra', goal=self.goal1)
+            Delivery.objects.create(name="d", description="", step=step)
+
+        with self.assertNumQueries(2):
+            client.get(reverse('needs:step_list'))
+
     def test_step_list_by_goal(self):
         client = APIClient()
         client.force_authenticate(user=self.user1)
@@ -734,9 +867,11 @@ class StepViewTest(TestCase):
         self.assertEqual(count, 3)
 
 
+@fast_hashing
 class IterationViewTest(TestCase):
 
     def setUp(self):
+        response_cache().clear()
         self.user1 = User.objects.create_user(
             'root1', 'email1@exemple.com', 'root')
         self.user2 = User.objects.create_user(
@@ -767,6 +902,42 @@ class IterationViewTest(TestCase):
 
     # ==============================================test_iteration_create===================================
 
+    def test_iteration_list_paginated(self):
+        Iteration.objects.create(number=3, completed=True, date=None, owner=self.user1)
+        Iteration.objects.create(number=4, completed=True,
+                                 date=datetime.date.today() - datetime.timedelta(days=7),
+                                 owner=self.user1)
+        Iteration.objects.create(number=5, completed=True, date=None, owner=self.user1)
+
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:iteration_list'))
+        stream = io.BytesIO(response.content)
+        expected = [iteration['id'] for iteration in JSONParser().parse(stream)]
+        self.assertEqual(len(expected), 5)
+
+        ids = []
+        params = {'page_size': 2}
+        while True:
+            response = client.get(reverse('needs:iteration_list'), params)
+            self.assertEqual(response.status_code, 200)
+            stream = io.BytesIO(response.content)
+            data = JSONParser().parse(stream)
+            self.assertLessEqual(len(data['results']), 2)
+            ids += [iteration['id'] for iteration in data['results']]
+            if data['next'] is None:
+                break
+            params['cursor'] = data['next']
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(ids[-2:], [4, 6])
+
+    def test_iteration_list_invalid_cursor(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:iteration_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
     def test_iteration_creation(self):
         count = Iteration.objects.all().count()
         self.assertEqual(count, 3)
@@ -790,6 +961,19 @@ class IterationViewTest(TestCase):
         self.assertEqual(iteration.date, datetime.date.today())
         self.assertEqual(iteration.owner, self.user1)
 
+    def test_iteration_creation_second_active(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.post(reverse('needs:iteration_list'), {
+            'number': 3,
+            'completed': False,
+            'date': datetime.date.today(),
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Iteration.objects.filter(owner=self.user1, completed=False).count(), 1)
+
     def test_iteration_creation_no_loged_user(self):
         count = Iteration.objects.all().count()
         self.assertEqual(count, 3)
@@ -973,9 +1157,117 @@ class IterationViewTest(TestCase):
         self.assertEqual(count, 3)
 
 
+    # ==============================================test_iteration_plan=====================================
+
+    def plan_fixture(self):
+        backlog = [Delivery.objects.create(name='backlog%d' % i, description='', step=self.step1)
+                   for i in range(3)]
+        planned = Delivery.objects.create(name='planned', description='', step=self.step1,
+                                          iteration=self.iteration2)
+        return backlog, planned
+
+    def test_iteration_plan(self):
+        backlog, planned = self.plan_fixture()
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        UserState.objects.create(user=self.user1)
+
+        # the ownership check, the UPDATE and the data version bump
+        with self.assertNumQueries(3):
+            response = client.post(reverse('needs:iteration_plan', kwargs={'pk': self.iteration2.pk}),
+                                   {'add': [delivery.pk for delivery in backlog],
+                                    'remove': [planned.pk]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['moved'], 4)
+        self.assertEqual(set(Delivery.objects.filter(iteration=self.iteration2)), set(backlog))
+        planned.refresh_from_db()
+        self.assertIsNone(planned.iteration)
+
+    def test_iteration_plan_other_users_delivery(self):
+        backlog, planned = self.plan_fixture()
+        other = Delivery.objects.create(name='other', description='',
+                                        step=Step.objects.create(name='s', goal=self.goal2))
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.post(reverse('needs:iteration_plan', kwargs={'pk': self.iteration2.pk}),
+                               {'add': [backlog[0].pk, other.pk]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Delivery.objects.filter(iteration=self.iteration2,
+                                                 pk__in=[backlog[0].pk, other.pk]).exists())
+
+    def test_iteration_plan_other_users_iteration(self):
+        backlog, planned = self.plan_fixture()
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.post(reverse('needs:iteration_plan', kwargs={'pk': self.iteration3.pk}),
+                               {'add': [backlog[0].pk]}, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_iteration_plan_add_and_remove_same_delivery(self):
+        backlog, planned = self.plan_fixture()
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.post(reverse('needs:iteration_plan', kwargs={'pk': self.iteration2.pk}),
+                               {'add': [planned.pk], 'remove': [planned.pk]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+    # ==============================================test_iteration_rollover=================================
+
+    def test_iteration_rollover(self):
+        done = Delivery.objects.create(name='done', description='', step=self.step1,
+                                       iteration=self.iteration2, completed=True)
+        open_deliveries = Delivery.objects.bulk_create(
+            [Delivery(name='open%d' % i, description='', step=self.step1,
+                      iteration=self.iteration2) for i in range(5)])
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.post(reverse('needs:iteration_rollover'))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['number'], 3)
+        self.assertFalse(response.data['completed'])
+        self.iteration2.refresh_from_db()
+        self.assertTrue(self.iteration2.completed)
+        following = Iteration.objects.get(owner=self.user1, completed=False)
+        self.assertEqual(following.pk, response.data['id'])
+        self.assertEqual(set(Delivery.objects.filter(iteration=following).values_list('name', flat=True)),
+                         {delivery.name for delivery in open_deliveries})
+        done.refresh_from_db()
+        self.assertEqual(done.iteration, self.iteration2)
+
+    def test_iteration_rollover_constant_queries(self):
+        UserState.objects.create(user=self.user1)
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        with CaptureQueriesContext(connection) as few:
+            client.post(reverse('needs:iteration_rollover'))
+        active = Iteration.objects.get(owner=self.user1, completed=False)
+        Delivery.objects.bulk_create(
+            [Delivery(name='open%d' % i, description='', step=self.step1,
+                      iteration=active) for i in range(30)])
+        with CaptureQueriesContext(connection) as many:
+            client.post(reverse('needs:iteration_rollover'))
+        self.assertEqual(len(few), len(many))
+
+    def test_iteration_rollover_without_active_iteration(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user2)
+        response = client.post(reverse('needs:iteration_rollover'))
+        self.assertEqual(response.status_code, 404)
+
+@fast_hashing
 class DeliveryViewTest(TestCase):
 
     def setUp(self):
+        response_cache().clear()
         self.user1 = User.objects.create_user(
             'root1', 'email1@exemple.com', 'root')
         self.user2 = User.objects.create_user(
@@ -998,7 +1290,7 @@ class DeliveryViewTest(TestCase):
 
         self.iteration1 = Iteration.objects.create(number=1, completed=False,
                                                    date=datetime.date.today(), owner=self.user1)
-        self.iteration2 = Iteration.objects.create(number=2, completed=False,
+        self.iteration2 = Iteration.objects.create(number=2, completed=True,
                                                    date=datetime.date.today(), owner=self.user1)
         self.iteration3 = Iteration.objects.create(number=1, completed=True,
                                                    date=datetime.date.today(), owner=self.user2)
@@ -1082,12 +1374,82 @@ class DeliveryViewTest(TestCase):
 
         self.assertEqual(len(data), 2)
 
+    @skipUnless(connection.vendor == 'sqlite', 'reads the SQLite query plan')
+    def test_delivery_list_page_uses_owner_index(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:delivery_list'), {'page_size': 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('needs:delivery_list'),
+                                  {'page_size': 1, 'cursor': response.data['next']})
+        self.assertEqual([delivery['id'] for delivery in response.data['results']],
+                         [self.delivery2.id])
+
+        page = [query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith('SELECT') and 'FROM "needs_delivery"' in query['sql']]
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + page[0])
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        # a range of the (owner, id) index, no sort of the owner's rows
+        self.assertIn('delivery_owner_id_idx (owner_id=? AND id>?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_delivery_list_streamed(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:delivery_list'))
+        stream = io.BytesIO(response.content)
+        expected = JSONParser().parse(stream)
+
+        response = client.get(reverse('needs:delivery_list'), {'stream': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        stream = io.BytesIO(b''.join(response.streaming_content))
+        data = JSONParser().parse(stream)
+        self.assertEqual(data, expected)
+
+    def test_delivery_list_by_goal_streamed(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:delivery_list_by_goal',
+                                      kwargs={'goal': self.goal1.id}), {'stream': 1})
+        self.assertEqual(response.status_code, 200)
+        stream = io.BytesIO(b''.join(response.streaming_content))
+        data = JSONParser().parse(stream)
+        self.assertEqual(len(data), Delivery.objects.filter(step__goal=self.goal1).count())
+
+    def test_delivery_list_expand_step(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        with self.assertNumQueries(2):
+            response = client.get(reverse('needs:delivery_list'),
+                                  {'fields': 'id,step', 'expand': 'step'})
+        self.assertEqual(response.status_code, 200)
+
+        stream = io.BytesIO(response.content)
+        data = JSONParser().parse(stream)
+        self.assertEqual(set(data[0]), {'id', 'step'})
+        self.assertEqual(data[0]['step']['id'], self.step1.id)
+        self.assertEqual(data[0]['step']['percentageCompleted'], '0.0%')
+
+    def test_delivery_list_includes_deliveries_without_step(self):
+        Delivery.objects.create(name='loose', description='no step', iteration=self.iteration1)
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:delivery_list'))
+
+        stream = io.BytesIO(response.content)
+        data = JSONParser().parse(stream)
+        self.assertIn('loose', [delivery['name'] for delivery in data])
+
     def test_delivery_list_no_loged_user(self):
         client = APIClient()
         response = client.get(reverse('needs:delivery_list'))
 
         self.assertEqual(response.status_code, 401)
 
+    # measures the view, rows are added behind the cache's back
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
     def test_delivery_list_by_step(self):
         client = APIClient()
         client.force_authenticate(user=self.user1)
@@ -1127,6 +1489,8 @@ class DeliveryViewTest(TestCase):
 
         self.assertEqual(len(data), 3)
 
+    # measures the view, rows are added behind the cache's back
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
     def test_delivery_list_by_goal(self):
         client = APIClient()
         client.force_authenticate(user=self.user1)
@@ -1166,6 +1530,8 @@ class DeliveryViewTest(TestCase):
 
         self.assertEqual(len(data), 3)
 
+    # measures the view, rows are added behind the cache's back
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
     def test_delivery_list_by_iteration(self):
         client = APIClient()
         client.force_authenticate(user=self.user1)
@@ -1224,6 +1590,27 @@ class DeliveryViewTest(TestCase):
         self.assertEqual(data['iteration'], self.iteration1.id)
         self.assertEqual(data['completed'], False)
 
+    def test_delivery_retrieve_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        with self.assertNumQueries(2):
+            response = client.get(reverse('needs:delivery_detail', kwargs={'pk': self.delivery1.id}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_delivery_retrieve_not_found(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        with self.assertNumQueries(2):
+            response = client.get(reverse('needs:delivery_detail', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_delivery_retrieve_without_step(self):
+        delivery = Delivery.objects.create(name='loose', description='no step')
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.get(reverse('needs:delivery_detail', kwargs={'pk': delivery.id}))
+        self.assertEqual(response.status_code, 403)
+
     def test_delivery_retrieve_no_loged_user(self):
         client = APIClient()
 
@@ -1339,9 +1726,104 @@ class DeliveryViewTest(TestCase):
         self.assertEqual(count, 3)
 
 
+    # ==============================================test_delivery_bulk_update==============================
+
+    def test_delivery_bulk_update(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.patch(reverse('needs:delivery_bulk_update'), [
+            {'id': self.delivery1.pk, 'completed': True},
+            {'id': self.delivery2.pk, 'step': self.step3.pk, 'name': 'moved'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data], [200, 200])
+        self.assertEqual(response.data[1]['data']['step'], self.step3.pk)
+        self.delivery1.refresh_from_db()
+        self.delivery2.refresh_from_db()
+        self.assertTrue(self.delivery1.completed)
+        self.assertEqual(self.delivery2.name, 'moved')
+        self.assertEqual(self.delivery2.step, self.step3)
+        self.step1.refresh_from_db()
+        self.step3.refresh_from_db()
+        self.assertEqual((self.step1.deliveries_total, self.step1.deliveries_completed), (1, 1))
+        self.assertEqual((self.step3.deliveries_total, self.step3.deliveries_completed), (1, 0))
+
+    def test_delivery_bulk_update_per_item_errors(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.patch(reverse('needs:delivery_bulk_update'), [
+            {'id': self.delivery1.pk, 'completed': True},
+            {'id': self.delivery3.pk, 'completed': True},
+            {'id': self.delivery2.pk, 'step': self.step2.pk},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data], [200, 404, 400])
+        self.assertIn('step', response.data[2]['errors'])
+        self.delivery3.refresh_from_db()
+        self.delivery2.refresh_from_db()
+        self.assertFalse(self.delivery3.completed)
+        self.assertEqual(self.delivery2.step, self.step1)
+
+    def test_delivery_bulk_update_rejects_non_integer_ids(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.patch(reverse('needs:delivery_bulk_update'), [
+            {'id': [self.delivery1.pk], 'completed': True},
+            {'id': {'pk': self.delivery1.pk}, 'completed': True},
+            {'id': True, 'completed': True},
+            {'completed': True},
+            {'id': self.delivery1.pk, 'step': True},
+            {'id': self.delivery1.pk, 'iteration': [self.iteration1.pk]},
+            {'id': self.delivery2.pk, 'step': float(self.step3.pk)},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data], [400] * 7)
+        for result in response.data[:4]:
+            self.assertIn('id', result['errors'])
+        self.assertIn('step', response.data[4]['errors'])
+        self.assertIn('iteration', response.data[5]['errors'])
+        self.assertIn('step', response.data[6]['errors'])
+        self.delivery1.refresh_from_db()
+        self.delivery2.refresh_from_db()
+        self.assertFalse(self.delivery1.completed)
+        self.assertEqual(self.delivery2.step, self.step1)
+
+    def test_delivery_bulk_update_constant_queries(self):
+        deliveries = Delivery.objects.bulk_create(
+            [Delivery(name='bulk', description='', step=self.step1, iteration=self.iteration1)
+             for _ in range(20)])
+        UserState.objects.create(user=self.user1)
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        def patch(items):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.patch(reverse('needs:delivery_bulk_update'), [
+                    {'id': delivery.pk, 'completed': True, 'step': self.step3.pk}
+                    for delivery in items], format='json')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.assertEqual(patch(deliveries[:2]), patch(deliveries[2:]))
+
+    def test_delivery_bulk_update_expects_list(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        response = client.patch(reverse('needs:delivery_bulk_update'),
+                                {'id': self.delivery1.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+@fast_hashing
 class UserViewTest(TestCase):
 
     def setUp(self):
+        response_cache().clear()
         self.user1 = User.objects.create_user(
             'root1', 'email1@exemple.com', 'root')
         self.user2 = User.objects.create_user(
@@ -1535,3 +2017,356 @@ class UserViewTest(TestCase):
         self.assertEqual(len(data), 1)
 
 
+
+
+@fast_hashing
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user(
+            'root1', 'email1@exemple.com', 'root')
+        self.user2 = User.objects.create_user(
+            'root2', 'email2@exemple.com', 'root')
+        self.need1 = Need.objects.create(
+            name='need1', description='need1 description', user=self.user1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+
+    def test_unchanged_poll_is_not_modified(self):
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('needs:need_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(reverse('needs:need_detail', kwargs={'pk': self.need1.pk}))['ETag']
+
+        response = self.client.put(reverse('needs:need_detail', kwargs={'pk': self.need1.pk}),
+                                   {'name': 'renamed', 'description': 'd'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('needs:need_detail', kwargs={'pk': self.need1.pk}),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['name'], 'renamed')
+
+    def test_failed_write_keeps_etag(self):
+        etag = self.client.get(reverse('needs:need_list'))['ETag']
+        response = self.client.post(reverse('needs:need_list'), {'name': ''}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('needs:need_list'))['ETag'], etag)
+
+    def test_any_etag_matches_existing_object_only(self):
+        response = self.client.get(reverse('needs:need_detail', kwargs={'pk': self.need1.pk}),
+                                   HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(reverse('needs:need_detail', kwargs={'pk': 99999}),
+                                   HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+    def test_etag_is_per_user(self):
+        etag = self.client.get(reverse('needs:need_list'))['ETag']
+        other = APIClient()
+        other.force_authenticate(user=self.user2)
+        response = other.get(reverse('needs:need_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@fast_hashing
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user(
+            'root1', 'email1@exemple.com', 'root')
+        self.user2 = User.objects.create_user(
+            'root2', 'email2@exemple.com', 'root')
+        self.need1 = Need.objects.create(
+            name='need1', description='need1 description', user=self.user1)
+        self.goal1 = Goal.objects.create(name='goal1', need=self.need1)
+        self.step1 = Step.objects.create(name='step1', goal=self.goal1)
+        self.delivery1 = Delivery.objects.create(name='delivery1', description='d',
+                                                 step=self.step1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+
+    def tearDown(self):
+        response_cache().clear()
+
+    def test_repeated_get_is_served_from_cache(self):
+        first = self.client.get(reverse('needs:need_list'))
+        # only the data version lookup of the ETag remains
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(first.data, second.data)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(reverse('needs:need_list'))
+        response = self.client.get(reverse('needs:need_list'), {'fields': 'id'})
+        self.assertEqual(set(response.data[0]), {'id'})
+
+    def test_cache_is_per_user(self):
+        self.client.get(reverse('needs:need_list'))
+        other = APIClient()
+        other.force_authenticate(user=self.user2)
+        response = other.get(reverse('needs:need_list'))
+        self.assertEqual(response.data, [])
+
+    def test_delivery_write_invalidates_progress(self):
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.data[0]['percentageCompleted'], '0.0%')
+
+        response = self.client.put(reverse('needs:delivery_detail', kwargs={'pk': self.delivery1.pk}),
+                                   {'name': 'delivery1', 'description': 'd',
+                                    'step': self.step1.pk, 'completed': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response.data[0]['percentageCompleted'], '100.0%')
+
+    def test_unrelated_write_keeps_shared_entry(self):
+        shared = dict(settings.CACHES, responses={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.mkdtemp()})
+        with self.settings(CACHES=shared):
+            self.addCleanup(shutil.rmtree, shared['responses']['LOCATION'])
+            self.client.get(reverse('needs:need_list'))
+            self.client.post(reverse('needs:iteration_list'),
+                             {'number': 1, 'completed': False, 'date': None}, format='json')
+            with self.assertNumQueries(1):
+                self.client.get(reverse('needs:need_list'))
+
+    def test_unrelated_write_misses_local_entry(self):
+        self.client.get(reverse('needs:need_list'))
+        self.client.post(reverse('needs:iteration_list'),
+                         {'number': 1, 'completed': False, 'date': None}, format='json')
+        with self.assertNumQueries(2):
+            self.client.get(reverse('needs:need_list'))
+
+    def test_write_on_another_worker(self):
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response['ETag'], '"%s.0"' % self.user1.pk)
+
+        # the other worker's invalidation never reaches this local cache
+        Need.objects.filter(pk=self.need1.pk).update(name='renamed')
+        UserState.bump_data_version([self.user1.pk])
+
+        response = self.client.get(reverse('needs:need_list'))
+        self.assertEqual(response['ETag'], '"%s.1"' % self.user1.pk)
+        self.assertEqual(response.data[0]['name'], 'renamed')
+
+    def test_stats(self):
+        self.client.get(reverse('needs:need_list'))
+        self.client.get(reverse('needs:need_list'))
+
+        response = self.client.get(reverse('needs:cache_stats'))
+        self.assertEqual(response.status_code, 403)
+
+        admin = APIClient()
+        admin.force_authenticate(user=User.objects.create_superuser('admin', 'a@exemple.com', 'a'))
+        response = admin.get(reverse('needs:cache_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['need_list_view'], {'hits': 1, 'misses': 1})
+
+    @override_settings(RESPONSE_CACHE_TIMEOUTS={'need_list_view': 0})
+    def test_timeout_per_view(self):
+        self.client.get(reverse('needs:need_list'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('needs:need_list'))
+
+
+@fast_hashing
+class BootstrapViewTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user(
+            'root1', 'email1@exemple.com', 'root')
+        self.user2 = User.objects.create_user(
+            'root2', 'email2@exemple.com', 'root')
+        self.need1 = Need.objects.create(
+            name='need1', description='need1 description', user=self.user1)
+        Need.objects.create(name='need2', description='need2 description', user=self.user2)
+        self.iteration1 = Iteration.objects.create(number=1, completed=False,
+                                                   date=datetime.date.today(), owner=self.user1)
+
+    def populate(self, goals):
+        for i in range(goals):
+            goal = Goal.objects.create(name='goal%d' % i, need=self.need1)
+            step = Step.objects.create(name='step%d' % i, goal=goal)
+            Delivery.objects.create(name='planned%d' % i, description='d', step=step,
+                                    iteration=self.iteration1, completed=i % 2 == 0)
+            Delivery.objects.create(name='backlog%d' % i, description='d', step=step)
+
+    def test_bootstrap(self):
+        self.populate(2)
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+
+        response = client.get(reverse('needs:bootstrap'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([need['name'] for need in response.data['needs']], ['need1'])
+        self.assertEqual(response.data['needs'][0]['percentageCompleted'], '25.0%')
+        self.assertEqual([goal['name'] for goal in response.data['goals']], ['goal0', 'goal1'])
+        self.assertEqual(response.data['goals'][0]['need']['name'], 'need1')
+        self.assertEqual(len(response.data['steps']), 2)
+        self.assertEqual(response.data['activeIteration']['id'], self.iteration1.pk)
+        self.assertEqual([delivery['name'] for delivery in response.data['deliveries']],
+                         ['planned0', 'planned1'])
+
+    # measures the view, rows are added behind the cache's back
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_bootstrap_query_count_is_fixed(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        self.populate(1)
+        with CaptureQueriesContext(connection) as few:
+            client.get(reverse('needs:bootstrap'))
+        self.populate(10)
+        with CaptureQueriesContext(connection) as many:
+            client.get(reverse('needs:bootstrap'))
+        # the data version lookup and five reads
+        self.assertEqual(len(few), 6)
+        self.assertEqual(len(many), 6)
+
+    def test_bootstrap_without_active_iteration(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user2)
+        response = client.get(reverse('needs:bootstrap'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['activeIteration'])
+        self.assertEqual(response.data['deliveries'], [])
+
+
+@fast_hashing
+class OnboardingViewTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user(
+            'root1', 'email1@exemple.com', 'root')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+
+    def assertOnboarded(self):
+        self.assertEqual(Need.objects.filter(user=self.user1).count(), 5)
+        iteration = Iteration.objects.get(owner=self.user1)
+        self.assertFalse(iteration.completed)
+        goal = Goal.objects.get(owner=self.user1)
+        self.assertEqual(goal.need.name, 'Others')
+        self.assertEqual(Step.objects.filter(goal=goal).count(), 4)
+        self.assertEqual(Delivery.objects.filter(owner=self.user1).count(), 14)
+        self.assertEqual(Delivery.objects.filter(iteration=iteration).count(), 11)
+        step = Step.objects.get(name='Learn About The Goals')
+        self.assertEqual(step.deliveries_total, 5)
+
+    def test_onboarding(self):
+        response = self.client.post(reverse('needs:onboarding'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'wizard': True, 'tutorial': True})
+        self.assertOnboarded()
+
+    def test_onboarding_is_idempotent(self):
+        self.client.post(reverse('needs:onboarding'))
+        response = self.client.post(reverse('needs:onboarding'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'wizard': False, 'tutorial': False})
+        self.assertOnboarded()
+
+    def test_wizard_then_tutorial(self):
+        self.assertEqual(self.client.post(reverse('needs:wizard')).status_code, 201)
+        self.assertEqual(self.client.post(reverse('needs:tutorial_setup')).status_code, 201)
+        self.assertEqual(self.client.post(reverse('needs:tutorial_setup')).status_code, 404)
+        self.assertOnboarded()
+
+    def test_tutorial_before_wizard(self):
+        response = self.client.post(reverse('needs:tutorial_setup'))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Goal.objects.exists())
+
+    def test_onboarding_without_others_need(self):
+        Need.objects.create(name='Health', description='d', user=self.user1)
+        Iteration.objects.create(number=0, completed=False, owner=self.user1)
+        response = self.client.post(reverse('needs:onboarding'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'wizard': False, 'tutorial': False})
+        self.assertFalse(Goal.objects.exists())
+
+    def test_onboarding_without_active_iteration(self):
+        Need.objects.create(name='Others', description='d', user=self.user1)
+        Iteration.objects.create(number=0, completed=True, owner=self.user1)
+        response = self.client.post(reverse('needs:onboarding'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'wizard': False, 'tutorial': False})
+        # the goal and steps inserted before the lookup failed are rolled back
+        self.assertFalse(Goal.objects.exists())
+        self.assertFalse(Step.objects.exists())
+        self.assertEqual(self.client.post(reverse('needs:tutorial_setup')).status_code, 404)
+
+    def test_onboarding_keeps_active_iteration(self):
+        active = Iteration.objects.create(number=3, completed=False, owner=self.user1)
+        response = self.client.post(reverse('needs:onboarding'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'wizard': True, 'tutorial': True})
+        self.assertEqual(Iteration.objects.get(owner=self.user1), active)
+        self.assertOnboarded()
+
+    def test_wizard_keeps_active_iteration(self):
+        active = Iteration.objects.create(number=3, completed=False, owner=self.user1)
+        response = self.client.post(reverse('needs:wizard'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Need.objects.filter(user=self.user1).count(), 5)
+        self.assertEqual(list(Iteration.objects.filter(owner=self.user1)), [active])
+
+    def test_onboarding_with_two_others_needs(self):
+        first = Need.objects.create(name='Others', description='d', user=self.user1)
+        Need.objects.create(name='Others', description='d', user=self.user1)
+        Iteration.objects.create(number=0, completed=False, owner=self.user1)
+        response = self.client.post(reverse('needs:onboarding'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'wizard': False, 'tutorial': True})
+        self.assertEqual(Goal.objects.get(owner=self.user1).need, first)
+
+    def test_onboarding_query_count_is_fixed(self):
+        from needs import seeds
+        with CaptureQueriesContext(connection) as queries:
+            seeds.apply(self.user1, seeds.WIZARD, seeds.TUTORIAL)
+        count = len(queries)
+
+        user2 = User.objects.create_user('root2', 'email2@exemple.com', 'root')
+        tutorial = seeds.Template('tutorial', seeds.TUTORIAL.done_if,
+                                  seeds.TUTORIAL.rows + seeds.TUTORIAL.rows[5:])
+        with CaptureQueriesContext(connection) as queries:
+            seeds.apply(user2, seeds.WIZARD, tutorial)
+        self.assertEqual(len(queries), count)
+
+
+@fast_hashing
+@override_settings(MIDDLEWARE=['needs.middleware.QueryCountMiddleware'] + settings.MIDDLEWARE)
+class QueryCountHeaderTest(TestCase):
+
+    def setUp(self):
+        response_cache().clear()
+        self.user1 = User.objects.create_user('root1', 'email1@exemple.com', 'root')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user1)
+
+    def test_reports_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/need/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Query-Count'], str(len(queries)))
+
+    def test_counts_per_request(self):
+        self.client.get('/need/')
+        response = self.client.get('/iteration/active/')
+        self.assertEqual(response['X-Query-Count'], '2')
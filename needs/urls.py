@@ -20,8 +20,11 @@ urlpatterns = [
     path('iteration/', views.iteration_list_view, name='iteration_list'),
     path('iteration/<int:pk>/', views.iteration_detail_view,
          name='iteration_detail'),
+    path('iteration/<int:pk>/plan/', views.iteration_plan_view, name='iteration_plan'),
     path('iteration/active/', views.iteration_get_active_view,
          name='active_iteration'),
+    path('iteration/active/rollover/', views.iteration_rollover_view,
+         name='iteration_rollover'),
 
     path('delivery/', views.delivery_list_view, name='delivery_list'),
     path('<int:goal>/delivery_by_goal/',
@@ -31,9 +34,16 @@ urlpatterns = [
     path('iteration/<int:iteration>/delivery/', views.delivery_list_by_iteration_view,
          name='delivery_list_by_iteration'),
     path('delivery/<int:pk>/', views.delivery_detail_view, name='delivery_detail'),
+    path('delivery/bulk/', views.delivery_bulk_update_view, name='delivery_bulk_update'),
     path('wizard/', views.wizard_view, name='wizard'),
+    path('bootstrap/', views.bootstrap_view, name='bootstrap'),
 
     path('tutorialsetup/', views.tutorial_setup_view, name='tutorial_setup'),
+    path('onboarding/', views.onboarding_view, name='onboarding'),
+
+    path('token/refresh/', views.token_refresh_view, name='token_refresh'),
+    path('cache/stats/', views.cache_stats_view, name='cache_stats'),
+    path('events/', views.event_stream_view, name='event_stream'),
 
 ]
 
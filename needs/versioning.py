@@ -0,0 +1,64 @@
+from functools import wraps
+
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import UserState
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def data_version(request):
+    """The user's ``UserState.data_version``, read once per request."""
+    if not hasattr(request, 'data_version'):
+        request.data_version = UserState.data_version_of(request.user.pk)
+    return request.data_version
+
+
+def data_etag(request):
+    return '"%s.%s"' % (request.user.pk, data_version(request))
+
+
+def if_none_match(request):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return [value.strip() for value in header.split(',')]
+
+
+def etag_matches(request, etag):
+    candidates = if_none_match(request)
+    return etag in candidates or 'W/' + etag in candidates
+
+
+def versioned(view):
+    """Conditional GETs for a view over the user's own data.
+
+    GETs carry an ETag built from ``UserState.data_version`` and are
+    answered with 304 from that single lookup when the client already has
+    it. Successful writes bump the version.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            response = view(request, *args, **kwargs)
+            if response.status_code < 400:
+                UserState.bump_data_version([request.user.pk])
+            return response
+
+        etag = data_etag(request)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view(request, *args, **kwargs)
+            # "*" matches any current representation, which only the view
+            # knows exists: a missing object stays a 404
+            if response.status_code == status.HTTP_200_OK and '*' in if_none_match(request):
+                response.close()
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    return wrapper
@@ -1,24 +1,79 @@
 from django.shortcuts import render
-from .models import Need, Goal, Step, Iteration, Delivery
-from .serializers import NeedSerializer, StepSerializer, IterationSerializer, DeliverySerializer, GoalGetSerializer, GoalPostPutSerializer
+from .models import Need, Goal, Step, Iteration, Delivery, SpentRefreshToken, UserState
+from .serializers import NeedSerializer, StepSerializer, IterationSerializer, DeliverySerializer, GoalGetSerializer, GoalPostPutSerializer, DeliveryBulkUpdateSerializer, IterationPlanSerializer
 from django.http import HttpResponse, JsonResponse
 from rest_framework.parsers import JSONParser
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import permissions
-from datetime import date, timedelta
+from rest_framework.renderers import JSONRenderer
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from .pagination import KeysetPagination
+from .streaming import stream_json_list
+from .lookups import get_owned_object
+from .tokens import REFRESH, issue_tokens, lifetime, read_token
+from .versioning import versioned
+from . import caching, events, seeds
+from .caching import cached
+from .events import publishes
 # Create your views here.
 
+# collections whose rows each kind of response is built from, see
+# needs.caching; step counters change with every delivery write
+NEED_READS = ('need', 'goal', 'step')
+GOAL_READS = ('goal', 'need', 'step')
+STEP_READS = ('step', 'goal')
+ITERATION_READS = ('iteration',)
+DELIVERY_READS = ('delivery', 'step', 'iteration')
+
+
+def field_options(request):
+    """The ?fields= and ?expand= serializer options of a request."""
+    options = {}
+    for name in ('fields', 'expand'):
+        if name in request.query_params:
+            options[name] = [value.strip() for value in
+                             request.query_params[name].split(',') if value.strip()]
+    return options
+
+
+def detail_object(request, queryset, serializer_class, pk):
+    """Fetch an owned object, projected to the requested fields when reading."""
+    if request.method == 'GET':
+        queryset = serializer_class(**field_options(request)).project(queryset)
+    return get_owned_object(queryset, pk, request.user)
+
+
+def list_response(request, queryset, serializer_class, ordering=('id',), streamable=False):
+    """Serialize a list view, paginated when the client asks for a cursor."""
+    options = field_options(request)
+    queryset = serializer_class(**options).project(queryset)
+    paginator = KeysetPagination(ordering)
+    if streamable and request.query_params.get('stream'):
+        return stream_json_list(paginator.order_queryset(queryset),
+                                serializer_class(**options))
+    if not paginator.is_requested(request):
+        queryset = paginator.order_queryset(queryset)
+        serializer = serializer_class(queryset, many=True, **options)
+        return Response(serializer.data)
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, **options)
+    return paginator.get_paginated_response(serializer.data)
+
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('need')
+@versioned
+@cached(reads=NEED_READS, writes=('need',))
 def need_list_view(request, format=None):
 
     if request.method == 'GET':
         needs = Need.objects.filter(user=request.user)
-        serializer = NeedSerializer(needs, many=True)
-        return Response(serializer.data)
+        return list_response(request, needs, NeedSerializer)
     if request.method == 'POST':
         data = JSONParser().parse(request)
         serializer = NeedSerializer(data=data)
@@ -31,17 +86,14 @@ def need_list_view(request, format=None):
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('need', changes={'DELETE': ('goal', 'step', 'delivery')})
+@versioned
+@cached(reads=NEED_READS, writes={'PUT': ('need',), 'DELETE': ('need', 'goal', 'step', 'delivery')})
 def need_detail_view(request, pk, format=None):
-    try:
-        need = Need.objects.get(pk=pk)
-    except Need.DoesNotExist:
-        return Response(status=status.HTTP_404_NOT_FOUND)
-
-    if request.user != need.user:
-        return Response(status=status.HTTP_403_FORBIDDEN)
+    need = detail_object(request, Need.objects.all(), NeedSerializer, pk)
 
     if request.method == 'GET':
-        serializer = NeedSerializer(need)
+        serializer = NeedSerializer(need, **field_options(request))
         return Response(serializer.data)
 
     if request.method == 'PUT':  # study
@@ -58,12 +110,14 @@ def need_detail_view(request, pk, format=None):
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('goal')
+@versioned
+@cached(reads=GOAL_READS, writes=('goal',))
 def goal_list_view(request, format=None):
 
     if request.method == 'GET':
-        goals = Goal.objects.filter(need__user=request.user)
-        serializer = GoalGetSerializer(goals, many=True)
-        return Response(serializer.data)
+        goals = Goal.objects.filter(owner=request.user)
+        return list_response(request, goals, GoalGetSerializer)
 
     if request.method == 'POST':
         data = JSONParser().parse(request)
@@ -76,27 +130,25 @@ def goal_list_view(request, format=None):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@versioned
+@cached(reads=GOAL_READS)
 def goal_list_by_need_view(request, need, format=None):
 
     if request.method == 'GET':
-        goals = Goal.objects.filter(need__user=request.user).filter(need=need)
-        serializer = GoalGetSerializer(goals, many=True)
-        return Response(serializer.data)
+        goals = Goal.objects.filter(owner=request.user).filter(need=need)
+        return list_response(request, goals, GoalGetSerializer)
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('goal', changes={'DELETE': ('step', 'delivery')})
+@versioned
+@cached(reads=GOAL_READS, writes={'PUT': ('goal',), 'DELETE': ('goal', 'step', 'delivery')})
 def goal_detail_view(request, pk, format=None):
-    try:
-        goal = Goal.objects.get(pk=pk)
-    except Goal.DoesNotExist:
-        return Response(status=status.HTTP_404_NOT_FOUND)
-
-    if goal.need.user != request.user:
-        return Response(status=status.HTTP_403_FORBIDDEN)
+    goal = detail_object(request, Goal.objects.all(), GoalGetSerializer, pk)
 
     if request.method == 'GET':
-        serializer = GoalGetSerializer(goal)
+        serializer = GoalGetSerializer(goal, **field_options(request))
         return Response(serializer.data)
     if request.method == 'PUT':
         data = JSONParser().parse(request)
@@ -112,11 +164,13 @@ def goal_detail_view(request, pk, format=None):
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('step')
+@versioned
+@cached(reads=STEP_READS, writes=('step',))
 def step_list_view(request, format=None):
     if request.method == 'GET':
-        steps = Step.objects.filter(goal__need__user=request.user)
-        serializer = StepSerializer(steps, many=True)
-        return Response(serializer.data)
+        steps = Step.objects.filter(owner=request.user)
+        return list_response(request, steps, StepSerializer)
 
     if request.method == 'POST':
         data = JSONParser().parse(request)
@@ -129,26 +183,24 @@ def step_list_view(request, format=None):
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@versioned
+@cached(reads=STEP_READS)
 def step_list_by_goal_view(request, goal,  format=None):
     if request.method == 'GET':
-        steps = Step.objects.filter(
-            goal__need__user=request.user).filter(goal=goal)
-        serializer = StepSerializer(steps, many=True)
-        return Response(serializer.data)
+        steps = Step.objects.filter(owner=request.user).filter(goal=goal)
+        return list_response(request, steps, StepSerializer)
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('step', changes={'DELETE': ('delivery',)})
+@versioned
+@cached(reads=STEP_READS, writes={'PUT': ('step',), 'DELETE': ('step', 'delivery')})
 def step_detail_view(request, pk, format=None):
-    try:
-        step = Step.objects.get(pk=pk)
-    except Step.DoesNotExist:
-        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
-    if step.goal.need.user != request.user:
-        return Response(status=status.HTTP_403_FORBIDDEN)
+    step = detail_object(request, Step.objects.all(), StepSerializer, pk)
 
     if request.method == 'GET':
-        serializer = StepSerializer(step)
+        serializer = StepSerializer(step, **field_options(request))
         return Response(serializer.data)
     if request.method == 'PUT':
         data = JSONParser().parse(request)
@@ -162,49 +214,95 @@ def step_detail_view(request, pk, format=None):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+ACTIVE_ITERATION_EXISTS = {'completed': ['Only one iteration can be active at a time.']}
+
+
+def save_iteration(serializer, **kwargs):
+    """Save an iteration, False if it would be a second active iteration."""
+    try:
+        with transaction.atomic():
+            serializer.save(**kwargs)
+    except IntegrityError:
+        return False
+    return True
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('iteration')
+@versioned
+@cached(reads=ITERATION_READS, writes=('iteration',))
 def iteration_list_view(request, format=None):
     if request.method == 'GET':
         iterations = Iteration.objects.filter(owner=request.user)
-        serializer = IterationSerializer(iterations, many=True)
-        return Response(serializer.data)
+        return list_response(request, iterations, IterationSerializer,
+                             ordering=('date', 'id'))
     if request.method == 'POST':
         data = JSONParser().parse(request)
         serializer = IterationSerializer(data=data)
         if serializer.is_valid():
-            serializer.save(owner=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(response.errors, status=status.HTTP_400_BAD_REQUEST)
+            if save_iteration(serializer, owner=request.user):
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(ACTIVE_ITERATION_EXISTS, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('iteration', changes={'DELETE': ('delivery', 'step')})
+@versioned
+@cached(reads=ITERATION_READS, writes={'PUT': ('iteration',), 'DELETE': ('iteration', 'delivery', 'step')})
 def iteration_detail_view(request, pk, format=None):
-    try:
-        iteration = Iteration.objects.get(pk=pk)
-    except Iteration.DoesNotExist:
-        return Response(status=status.HTTP_404_NOT_FOUND)
-
-    if iteration.owner != request.user:
-        return Response(status=status.HTTP_403_FORBIDDEN)
+    iteration = detail_object(request, Iteration.objects.all(), IterationSerializer, pk)
     if request.method == 'GET':
-        serializer = IterationSerializer(iteration)
+        serializer = IterationSerializer(iteration, **field_options(request))
         return Response(serializer.data)
     if request.method == 'PUT':
         data = JSONParser().parse(request)
         serializer = IterationSerializer(iteration, data=data)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            if save_iteration(serializer):
+                return Response(serializer.data)
+            return Response(ACTIVE_ITERATION_EXISTS, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     if request.method == 'DELETE':
         iteration.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@publishes('delivery')
+@versioned
+@cached(reads=(), writes=('delivery',))
+def iteration_plan_view(request, pk, format=None):
+    """Add deliveries to an iteration and send others back to the backlog.
+
+    The iteration and the number of listed deliveries sharing its owner are
+    read in one query; the move itself is a single UPDATE.
+    """
+    serializer = IterationPlanSerializer(data=JSONParser().parse(request))
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    add = set(serializer.validated_data['add'])
+    remove = set(serializer.validated_data['remove'])
+
+    owned = Delivery.objects.filter(owner=OuterRef('owner'), pk__in=add | remove).order_by(
+        ).values('owner').annotate(count=Count('pk')).values('count')
+    iteration = get_owned_object(
+        Iteration.objects.annotate(owned_deliveries=Coalesce(Subquery(owned), 0)),
+        pk, request.user)
+    if iteration.owned_deliveries != len(add | remove):
+        return Response({'detail': 'Unknown delivery ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    moved = Delivery.objects.filter(owner=request.user).plan_iteration(iteration.pk, add, remove)
+    return Response({'moved': moved})
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@versioned
+@cached(reads=ITERATION_READS)
 def iteration_get_active_view(request, format=None):
     try:
         iteration = Iteration.objects.filter(
@@ -216,65 +314,81 @@ def iteration_get_active_view(request, format=None):
         return Response(serializer.data)
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@publishes('iteration', changes=('iteration', 'delivery'))
+@versioned
+@cached(reads=(), writes=('iteration', 'delivery'))
+def iteration_rollover_view(request, format=None):
+    with transaction.atomic():
+        iteration = Iteration.objects.select_for_update().filter(
+            owner=request.user, completed=False).first()
+        if iteration is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        following = iteration.rollover()
+    serializer = IterationSerializer(following)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('delivery', changes=('step',))
+@versioned
+@cached(reads=DELIVERY_READS, writes=('delivery', 'step'))
 def delivery_list_view(request, format=None):
     if request.method == 'GET':
-        deliveries = Delivery.objects.filter(
-            step__goal__need__user=request.user)
-        serializer = DeliverySerializer(deliveries, many=True)
-        return Response(serializer.data)
+        deliveries = Delivery.objects.filter(owner=request.user)
+        return list_response(request, deliveries, DeliverySerializer,
+                             streamable=True)
     if request.method == 'POST':
         data = JSONParser().parse(request)
         serializer = DeliverySerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(owner=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@versioned
+@cached(reads=DELIVERY_READS)
 def delivery_list_by_step_view(request, step, format=None):
     if request.method == 'GET':
-        deliveries = Delivery.objects.filter(
-            step__goal__need__user=request.user).filter(step=step)
-        serializer = DeliverySerializer(deliveries, many=True)
-        return Response(serializer.data)
+        deliveries = Delivery.objects.filter(owner=request.user).filter(step=step)
+        return list_response(request, deliveries, DeliverySerializer)
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@versioned
+@cached(reads=DELIVERY_READS)
 def delivery_list_by_goal_view(request, goal, format=None):
     if request.method == 'GET':
-        deliveries = Delivery.objects.filter(
-            step__goal__need__user=request.user).filter(step__goal=goal)
-        serializer = DeliverySerializer(deliveries, many=True)
-        return Response(serializer.data)
+        deliveries = Delivery.objects.filter(owner=request.user).filter(step__goal=goal)
+        return list_response(request, deliveries, DeliverySerializer,
+                             streamable=True)
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
+@versioned
+@cached(reads=DELIVERY_READS)
 def delivery_list_by_iteration_view(request, iteration, format=None):
     if request.method == 'GET':
-        deliveries = Delivery.objects.filter(
-            step__goal__need__user=request.user).filter(iteration=iteration)
-        serializer = DeliverySerializer(deliveries, many=True)
-        return Response(serializer.data)
+        deliveries = Delivery.objects.filter(owner=request.user).filter(iteration=iteration)
+        return list_response(request, deliveries, DeliverySerializer)
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes('delivery', changes=('step',))
+@versioned
+@cached(reads=DELIVERY_READS, writes=('delivery', 'step'))
 def delivery_detail_view(request, pk, format=None):
-    try:
-        delivery = Delivery.objects.get(pk=pk)
-    except Delivery.DoesNotExist:
-        return Response(status=404)
-
-    if delivery.step.goal.need.user != request.user:
-        return Response(status=status.HTTP_403_FORBIDDEN)
+    delivery = detail_object(request, Delivery.objects.all(), DeliverySerializer, pk)
     if request.method == 'GET':
-        serializer = DeliverySerializer(delivery)
+        serializer = DeliverySerializer(delivery, **field_options(request))
         return Response(serializer.data)
     if request.method == 'PUT':
         data = JSONParser().parse(request)
@@ -288,83 +402,162 @@ def delivery_detail_view(request, pk, format=None):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+def is_pk(value):
+    """Whether a JSON value is a primary key; true and false are not."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@api_view(['PATCH'])
+@permission_classes([permissions.IsAuthenticated])
+@publishes('delivery', changes=('step',))
+@versioned
+@cached(reads=(), writes=('delivery', 'step'))
+def delivery_bulk_update_view(request, format=None):
+    """Apply a list of partial delivery updates, each identified by ``id``.
+
+    Deliveries and the steps and iterations they are moved to are fetched
+    with one query each, and all valid items are written with a single
+    bulk_update, so the query count does not grow with the batch.
+    """
+    data = JSONParser().parse(request)
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        return Response({'detail': 'Expected a list of objects.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    def referenced(name):
+        return {item[name] for item in data if is_pk(item.get(name))}
+
+    deliveries = Delivery.objects.filter(owner=request.user).in_bulk(referenced('id'))
+    related = {'step': {}, 'iteration': {}}
+    if referenced('step'):
+        related['step'] = Step.objects.filter(owner=request.user).in_bulk(referenced('step'))
+    if referenced('iteration'):
+        related['iteration'] = Iteration.objects.filter(
+            owner=request.user).in_bulk(referenced('iteration'))
+
+    results = []
+    changed = {}
+    fields = set()
+    for item in data:
+        if not is_pk(item.get('id')):
+            results.append({'id': item.get('id'), 'status': status.HTTP_400_BAD_REQUEST,
+                            'errors': {'id': ['A valid integer is required.']}})
+            continue
+        delivery = deliveries.get(item['id'])
+        if delivery is None:
+            results.append({'id': item.get('id'), 'status': status.HTTP_404_NOT_FOUND,
+                            'errors': {'detail': 'Not found.'}})
+            continue
+        serializer = DeliveryBulkUpdateSerializer(
+            delivery, data=item, partial=True, context={'related': related})
+        if not serializer.is_valid():
+            results.append({'id': delivery.pk, 'status': status.HTTP_400_BAD_REQUEST,
+                            'errors': serializer.errors})
+            continue
+        for name, value in serializer.validated_data.items():
+            setattr(delivery, name, value)
+        fields.update(serializer.validated_data)
+        changed[delivery.pk] = delivery
+        results.append({'id': delivery.pk, 'status': status.HTTP_200_OK})
+
+    if changed and fields:
+        Delivery.objects.bulk_update(changed.values(), fields)
+    for result in results:
+        if result['status'] == status.HTTP_200_OK:
+            result['data'] = DeliverySerializer(changed[result['id']]).data
+    return Response(results)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@versioned
+@cached(reads=('need', 'goal', 'step', 'iteration', 'delivery'))
+def bootstrap_view(request, format=None):
+    """Everything the app shell loads on launch, in five queries.
+
+    Goals get their nested need from the already loaded needs and the
+    active iteration's deliveries come from one prefetch query.
+    """
+    needs = list(Need.objects.filter(user=request.user).with_progress().order_by('id'))
+    needs_by_id = {need.pk: need for need in needs}
+    goals = list(Goal.objects.filter(owner=request.user).with_progress().order_by('id'))
+    for goal in goals:
+        goal.need = needs_by_id[goal.need_id]
+    steps = Step.objects.filter(owner=request.user).order_by('id')
+    iteration = Iteration.objects.filter(owner=request.user, completed=False).prefetch_related(
+        Prefetch('delivery_set', queryset=Delivery.objects.order_by('id'))).first()
+
+    return Response({
+        'needs': NeedSerializer(needs, many=True).data,
+        'goals': GoalGetSerializer(goals, many=True).data,
+        'steps': StepSerializer(steps, many=True).data,
+        'activeIteration': IterationSerializer(iteration).data if iteration else None,
+        'deliveries': DeliverySerializer(
+            iteration.delivery_set.all() if iteration else [], many=True).data,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes(changes=('need', 'iteration'))
+@versioned
+@cached(reads=(), writes=('need', 'iteration'))
 def wizard_view(request, format=None):
     if request.method == 'POST':
-        needs = Need.objects.filter(user=request.user)
-        if(needs.count() == 0):
-            Need.objects.create(
-                name='Health', description='need1 description', user=request.user, iconName="far fa-heart", iconColor="bg-red-500")
-            Need.objects.create(
-                name='Finance', description='need2 description', user=request.user, iconName="far fa-chart-bar", iconColor="bg-red-500")
-            Need.objects.create(
-                name='Professional', description='need3 description', user=request.user, iconName="fas fa-user-tie", iconColor="bg-red-500")
-            Need.objects.create(
-                name='Mind', description='need4 description', user=request.user, iconName="fas fa-code-branch", iconColor="bg-red-500")
-            Need.objects.create(
-                name='Others', description='need5 description', user=request.user, iconName="far fa-handshake", iconColor="bg-red-500")
-
-            dateToBeUsed = date.today() + timedelta(days=5)
-            Iteration.objects.create(
-                number=0, completed=False, date=dateToBeUsed, owner=request.user)
-
+        if seeds.apply(request.user, seeds.WIZARD)['wizard']:
             return Response(status=status.HTTP_201_CREATED)
         return Response(status=404)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@publishes(changes=('goal', 'step', 'delivery'))
+@versioned
+@cached(reads=(), writes=('goal', 'step', 'delivery'))
 def tutorial_setup_view(request, format=None):
     if request.method == 'POST':
-        iteration = Iteration.objects.get(owner=request.user)
-        need = Need.objects.filter(name='Others').get(user=request.user)
-        goal = Goal.objects.create(
-            name='tutorial', description="tutorial", endDate=None, need=need)
-
-        step1 = Step.objects.create(
-            name="Learn To Check", description="d", goal=goal, completed=False)
-        step2 = Step.objects.create(
-            name="Learn About The Goals", description="d", goal=goal, completed=False)
-        step3 = Step.objects.create(
-            name="Learn About The Steps", description="d", goal=goal, completed=False)
-        step4 = Step.objects.create(
-            name="Learn About The Iterations", description="d", goal=goal, completed=False)
-
-        deliveries = []
-
-        deliveries.append(Delivery(name="Welcome to IginApp", description="Be welcome, we'll try our best",
-                          step=step1, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="Mark a task as completed by checking the side box!", description="You can mark a task as completed by checking the side box!",
-                          step=step1, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="Check us when you complete the task", description="Check us when you complete the task",
-                          step=step1, iteration=iteration, completed=False))
-
-        deliveries.append(Delivery(name="Our Needs are Health, Mind,Financial,Professional and Others", description="that's right",
-                          step=step2, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="The App is based on Goals and Needs", description="The App is based on Goals and Needs",
-                          step=step2, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="Click the tutorial Goal on the side Goal box!", description="Click the tutorial Goal on the side Goal box!",
-                          step=step2, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="We need to complete some steps to complete the goal!", description="We need to complete some steps to complete the goal",
-                          step=step2, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="The second Step is Ok with this task!", description="Done",
-                          step=step2, iteration=iteration, completed=False))
-
-        deliveries.append(Delivery(name="Click the learn step step", description="Click the learn step step",
-                          step=step3, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="Each Step is composed of tasks!", description="Each Step is composed of tasks!",
-                          step=step3, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="To add a new task on a step click the 'add new' button", description="Hope you are doing good",
-                          step=step3, iteration=iteration, completed=False))
-        deliveries.append(Delivery(name="To define a task to be done click 'Add' on the side", description="Right now the task is going to show up in the to-do box",
-                          step=step3, iteration=None, completed=False))
-        deliveries.append(Delivery(name="You can remove a task from your todo list by clicking remove", description="You can remove a task from your to-do list by clicking 'remove'",
-                          step=step3, iteration=None, completed=False))
-        deliveries.append(Delivery(name="You can click the task name to edit!", description="You can click the task name to edit!",
-                          step=step3, iteration=None, completed=False))
-
-        Delivery.objects.bulk_create(deliveries)
-
-        return Response(status=status.HTTP_201_CREATED)
+        # not applied when done already, or before the wizard has run
+        if seeds.apply(request.user, seeds.TUTORIAL)['tutorial']:
+            return Response(status=status.HTTP_201_CREATED)
     return Response(status=404)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@publishes(changes=('need', 'iteration', 'goal', 'step', 'delivery'))
+@versioned
+@cached(reads=(), writes=('need', 'iteration', 'goal', 'step', 'delivery'))
+def onboarding_view(request, format=None):
+    """The wizard and the tutorial in one transaction, safe to resubmit."""
+    applied = seeds.apply(request.user, seeds.WIZARD, seeds.TUTORIAL)
+    created = any(applied.values())
+    return Response(applied, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def token_refresh_view(request, format=None):
+    """Exchange a refresh token for a new pair; each refresh token works once."""
+    payload = read_token(str(request.data.get('refresh', '')), REFRESH)
+    if payload is not None and 'jti' in payload:
+        state = UserState.objects.filter(
+            user_id=payload['uid'], user__is_active=True).select_related('user').first()
+        if (state is not None and state.token_version == payload['ver']
+                and SpentRefreshToken.spend(payload['jti'], lifetime(REFRESH))):
+            return Response(issue_tokens(state.user, state.token_version))
+    return Response({'detail': 'Invalid refresh token.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats_view(request, format=None):
+    return Response(caching.stats())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([JSONRenderer, events.EventStreamRenderer])
+def event_stream_view(request, format=None):
+    """Server-Sent Events of the changes to the user's data, see needs.events."""
+    return events.stream_response(request.user.pk, request.META.get('HTTP_LAST_EVENT_ID'))